@@ -0,0 +1,17 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0002_auto_20210623_0408'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['posting', 'create_at'], name='comments_posting_create_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:44
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_threads(apps, schema_editor):
+    Comment = apps.get_model('comments', 'Comment')
+    parents = dict(Comment.objects.filter(comment__isnull=False).values_list('id', 'comment_id'))
+    threads = defaultdict(list)
+
+    for comment_id in parents:
+        root = parents[comment_id]
+        while root in parents:
+            root = parents[root]
+        threads[root].append(comment_id)
+
+    for root, comment_ids in threads.items():
+        Comment.objects.filter(id__in=comment_ids).update(thread_id=root)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_comment_posting_create_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='thread',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='comments.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['thread', 'create_at'], name='comments_thread_create_idx'),
+        ),
+        migrations.RunPython(fill_threads, migrations.RunPython.noop),
+    ]
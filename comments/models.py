@@ -4,9 +4,14 @@ class Comment(models.Model):
     posting   = models.ForeignKey('postings.Posting', on_delete=models.CASCADE)
     user      = models.ForeignKey('users.User', on_delete=models.CASCADE)
     comment   = models.ForeignKey('self', on_delete=models.CASCADE, null=True,related_name='re_comment')
+    thread    = models.ForeignKey('self', on_delete=models.CASCADE, null=True, related_name='thread_replies')
     text      = models.CharField(max_length=100)
     create_at = models.DateTimeField(auto_now_add=True) 
     update_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        db_table = 'comments'
\ No newline at end of file
+        db_table = 'comments'
+        indexes  = [
+            models.Index(fields=['posting', 'create_at'], name='comments_posting_create_idx'),
+            models.Index(fields=['thread', 'create_at'], name='comments_thread_create_idx'),
+        ]
@@ -1,3 +1,217 @@
-from django.test import TestCase
+import jwt, json
 
-# Create your tests here.
+from unittest.mock import patch
+
+from django.test import TestCase, Client, override_settings
+
+from .models         import Comment
+from postings.models import Posting, HousingType, Style, Size, Color
+from users.models    import User
+from my_settings     import SECRET_KEY, ALGORITHM
+
+class CommentViewTest(TestCase):
+    def setUp(self):
+        user  = User.objects.create(
+            id            = 1,
+            email         = 'asdf@naver.com',
+            nickname      = 'wecode',
+            kakao_id      = '1',
+            profile_image = 'profile_image_url'
+            )
+        color = Color.objects.create(id=1, type='red')
+        Posting.objects.create(
+            id           = 1,
+            user         = user,
+            housing_type = HousingType.objects.create(id=1, type='one_room'),
+            size         = Size.objects.create(id=1, type='10'),
+            style        = Style.objects.create(id=1, type='modern'),
+            item_color   = color,
+            back_color   = color,
+            image        = 'posting_image_url',
+            text         = '너무 이쁜집',
+            update_at    = '2021-06-28'
+            )
+        self.token = jwt.encode({'id': 1}, SECRET_KEY, ALGORITHM)
+
+    def test_comment_updates_comment_count(self):
+        client   = Client()
+        response = client.post(
+            '/comments?posting_id=1',
+            {'text': '너무 이쁘네요'},
+            content_type       = 'application/json',
+            HTTP_Authorization = self.token
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Posting.objects.get(id=1).comment_count, 1)
+
+        comment = Comment.objects.get(posting_id=1)
+        Comment.objects.create(posting_id=1, user_id=1, comment=comment, text='감사합니다')
+        Posting.objects.filter(id=1).update(comment_count=2)
+
+        response = client.delete(f'/comments/{comment.id}', HTTP_Authorization=self.token)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(Posting.objects.get(id=1).comment_count, 0)
+
+    def test_comment_list_cursor_page_get(self):
+        for number in range(5):
+            Comment.objects.create(id=number+1, posting_id=1, user_id=1, text=f'댓글{number}')
+        Comment.objects.filter(id__in=[2, 3]).update(create_at='2021-06-28 00:00:00+00:00')
+
+        client = Client()
+        with self.assertNumQueries(3):
+            first_page = client.get('/comments?posting_id=1&limit=2').json()
+        second_page = client.get(f'/comments?posting_id=1&limit=2&cursor={first_page["next_cursor"]}').json()
+        last_page   = client.get(f'/comments?posting_id=1&limit=2&cursor={second_page["next_cursor"]}').json()
+
+        self.assertEqual([comment['id'] for comment in first_page['comment']], [5, 4])
+        self.assertEqual([comment['id'] for comment in second_page['comment']], [1, 3])
+        self.assertEqual([comment['id'] for comment in last_page['comment']], [2])
+        self.assertIsNone(last_page['next_cursor'])
+        self.assertEqual(client.get('/comments?posting_id=1&limit=2&offset=2').json(), second_page)
+
+    def test_comment_list_invalid_cursor(self):
+        response = Client().get('/comments?posting_id=1&cursor=wrong_cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'INVALID_CURSOR'})
+
+    def test_comment_list_not_modified(self):
+        comment  = Comment.objects.create(posting_id=1, user_id=1, text='댓글')
+        client   = Client()
+        response = client.get('/comments?posting_id=1')
+        etag     = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = client.get('/comments?posting_id=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        self.assertNotEqual(client.get('/comments?posting_id=1&limit=1')['ETag'], etag)
+
+        client.patch(f'/comments/{comment.id}', {'text': '수정된 댓글'}, content_type='application/json', HTTP_Authorization=self.token)
+        response = client.get('/comments?posting_id=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comment'][0]['text'], '수정된 댓글')
+
+    @patch('comments.views.time.time', return_value=600)
+    def test_comment_list_author_change_bounded(self, mock_time):
+        Comment.objects.create(posting_id=1, user_id=1, text='댓글')
+        client = Client()
+        etag   = client.get('/comments?posting_id=1')['ETag']
+        User.objects.filter(id=1).update(nickname='바뀐닉네임')
+
+        mock_time.return_value = 659
+        self.assertEqual(client.get('/comments?posting_id=1', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        mock_time.return_value = 660
+        response = client.get('/comments?posting_id=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comment'][0]['user_nickname'], '바뀐닉네임')
+
+    @override_settings(STREAM_THRESHOLD=2)
+    def test_comment_list_stream(self):
+        for number in range(4):
+            Comment.objects.create(posting_id=1, user_id=1, text=f'댓글{number}')
+
+        client   = Client()
+        streamed = client.get('/comments?posting_id=1&limit=3')
+        plain    = client.get('/comments?posting_id=1&limit=2')
+
+        self.assertTrue(streamed.streaming)
+        self.assertFalse(plain.streaming)
+        body = json.loads(b''.join(streamed.streaming_content))
+        self.assertEqual(len(body['comment']), 3)
+        self.assertEqual(body['comment'][:2], plain.json()['comment'])
+        self.assertIsNotNone(body['next_cursor'])
+
+    def test_comment_threads(self):
+        client = Client()
+        root   = Comment.objects.create(posting_id=1, user_id=1, text='질문')
+        other  = Comment.objects.create(posting_id=1, user_id=1, text='다른 댓글')
+        for number in range(4):
+            response = client.post(
+                '/comments?posting_id=1',
+                {'text': f'답글{number}', 'comment_id': root.id},
+                content_type       = 'application/json',
+                HTTP_Authorization = self.token
+                )
+            self.assertEqual(response.status_code, 201)
+        first_reply = Comment.objects.get(text='답글0')
+        client.post(
+            '/comments?posting_id=1',
+            {'text': '답글의 답글', 'comment_id': first_reply.id},
+            content_type       = 'application/json',
+            HTTP_Authorization = self.token
+            )
+        self.assertEqual(Comment.objects.get(text='답글의 답글').thread_id, root.id)
+
+        with self.assertNumQueries(3):
+            threads = client.get('/comments?posting_id=1').json()['comment']
+
+        self.assertEqual([thread['id'] for thread in threads], [other.id, root.id])
+        self.assertEqual(threads[0]['replies'], [])
+        self.assertIsNone(threads[0]['replies_cursor'])
+        self.assertEqual(threads[1]['reply_count'], 5)
+        self.assertEqual([reply['text'] for reply in threads[1]['replies']], ['답글0', '답글1', '답글2'])
+        self.assertEqual(threads[1]['replies'][0]['parent_id'], root.id)
+
+        response = client.get(f'/comments/{root.id}/replies?cursor={threads[1]["replies_cursor"]}').json()
+        self.assertEqual([reply['text'] for reply in response['comment']], ['답글3', '답글의 답글'])
+        self.assertEqual(response['comment'][1]['parent_id'], first_reply.id)
+        self.assertIsNone(response['next_cursor'])
+
+    @override_settings(COMMENT_REPLIES_PER_THREAD=2)
+    def test_comment_threads_cutoff_breaks_ties_by_id(self):
+        roots = [Comment.objects.create(posting_id=1, user_id=1, text=f'질문{number}') for number in range(2)]
+        for number in range(4):
+            Comment.objects.create(posting_id=1, user_id=1, comment=roots[0], thread=roots[0], text=f'답글{number}')
+        Comment.objects.create(posting_id=1, user_id=1, comment=roots[1], thread=roots[1], text='하나뿐인 답글')
+        Comment.objects.filter(thread=roots[0]).update(create_at='2021-06-28 00:00:00+00:00')
+
+        threads = {thread['id']: thread for thread in Client().get('/comments?posting_id=1').json()['comment']}
+
+        self.assertEqual([reply['text'] for reply in threads[roots[0].id]['replies']], ['답글0', '답글1'])
+        self.assertEqual(threads[roots[0].id]['reply_count'], 4)
+        self.assertIsNotNone(threads[roots[0].id]['replies_cursor'])
+        self.assertEqual([reply['text'] for reply in threads[roots[1].id]['replies']], ['하나뿐인 답글'])
+        self.assertIsNone(threads[roots[1].id]['replies_cursor'])
+
+    def test_comment_reply_to_missing_comment(self):
+        response = Client().post(
+            '/comments?posting_id=1',
+            {'text': '답글', 'comment_id': 100},
+            content_type       = 'application/json',
+            HTTP_Authorization = self.token
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'INVALID_COMMENT_ID'})
+
+    def test_comment_updates_posting_preview(self):
+        client = Client()
+        for text in ['첫 댓글', '새 댓글']:
+            client.post('/comments?posting_id=1', {'text': text}, content_type='application/json', HTTP_Authorization=self.token)
+        latest = Comment.objects.get(text='새 댓글')
+        client.post(
+            '/comments?posting_id=1',
+            {'text': '답글', 'comment_id': latest.id},
+            content_type       = 'application/json',
+            HTTP_Authorization = self.token
+            )
+
+        posting = Posting.objects.get(id=1)
+        self.assertEqual(posting.preview_comment_id, latest.id)
+        self.assertEqual((posting.preview_text, posting.preview_nickname, posting.preview_profile_image), ('새 댓글', 'wecode', 'profile_image_url'))
+
+        client.patch(f'/comments/{latest.id}', {'text': '고친 댓글'}, content_type='application/json', HTTP_Authorization=self.token)
+        self.assertEqual(Posting.objects.get(id=1).preview_text, '고친 댓글')
+
+        client.delete(f'/comments/{latest.id}', HTTP_Authorization=self.token)
+        posting = Posting.objects.get(id=1)
+        self.assertEqual((posting.preview_comment_id, posting.preview_text), (Comment.objects.get(text='첫 댓글').id, '첫 댓글'))
+
+        client.delete(f'/comments/{posting.preview_comment_id}', HTTP_Authorization=self.token)
+        posting = Posting.objects.get(id=1)
+        self.assertEqual((posting.preview_comment_id, posting.preview_text), (None, None))
+
+        with self.assertNumQueries(1):
+            card = client.get('/postings').json()['result'][0]
+        self.assertEqual((card['writerName'], card['commentContent']), ('', ''))
@@ -1,9 +1,10 @@
 from django.urls import path
 
-from .views import CommentView
+from .views import CommentView, CommentRepliesView
 
 urlpatterns = [
     path('', CommentView.as_view()),
     path('/<int:comment_id>', CommentView.as_view()),
+    path('/<int:comment_id>/replies', CommentRepliesView.as_view()),
     
 ]
\ No newline at end of file
@@ -1,11 +1,75 @@
-import json
+import json, time
+from collections import defaultdict
 
-from django.http  import JsonResponse
-from django.views import View
+from django.conf                 import settings
+from django.core.exceptions      import ValidationError
+from django.db                   import transaction
+from django.db.models            import Q, F, Count, Value, Case, When, OuterRef, Subquery
+from django.db.models.functions  import Coalesce
+from django.http                 import JsonResponse
+from django.utils                import timezone
+from django.views                import View
+from django.utils.decorators     import method_decorator
+from django.views.decorators.http import condition
 
-from .models         import Comment
-from postings.models import Posting
-from users.utils     import authorize_user
+from .models             import Comment
+from postings.models     import Posting
+from postings.utils      import encode_cursor, decode_cursor, keyset_filter, keyset_order, page_cursor, feed_cache, StreamedPage, score_change, comment_preview, latest_comment_preview
+from users.utils         import authorize_user
+from yourhousetoday.http import make_etag, stream_requested, StreamingJsonResponse
+
+REPLY_SORT = 'create_at'
+
+reply_count = Comment.objects.filter(thread=OuterRef('pk')).values('thread').annotate(count=Count('id')).values('count')
+
+def reply_cutoff():
+    limit = settings.COMMENT_REPLIES_PER_THREAD
+    nth   = Comment.objects.filter(thread=OuterRef('pk')).order_by(*keyset_order(REPLY_SORT))[limit-1:limit]
+    return {'cutoff_at': Subquery(nth.values('create_at')), 'cutoff_id': Subquery(nth.values('id'))}
+
+def comments_etag(request, comment_id=None):
+    posting_id = int(request.GET.get('posting_id', 0))
+    validator  = Posting.objects.filter(id=posting_id).values_list('comment_count', 'comment_update_at').first()
+    authors    = int(time.time() // settings.COMMENT_AUTHOR_STALENESS)
+    return make_etag(request.GET.urlencode(), *validator, authors) if validator else None
+
+def comment_item(comment):
+    return {
+        'id'            : comment.id,
+        'text'          : comment.text,
+        'create_at'     : str(comment.create_at)[:10],
+        'user_id'       : comment.user.id,
+        'user_nickname' : comment.user.nickname,
+        'user_profile'  : comment.user.profile_image
+    }
+
+def reply_items(replies):
+    return [{**comment_item(reply), 'parent_id': reply.comment_id} for reply in replies]
+
+def comment_threads(roots):
+    if not roots:
+        return []
+
+    bounded = Q()
+    for root in roots:
+        if root.cutoff_id is None:
+            bounded |= Q(thread_id=root.id)
+        else:
+            bounded |= Q(thread_id=root.id) & (Q(create_at__lt=root.cutoff_at) | Q(create_at=root.cutoff_at, id__lte=root.cutoff_id))
+
+    replies = Comment.objects.select_related('user').filter(bounded).order_by('create_at', 'id')
+
+    threads = defaultdict(list)
+    for reply in replies:
+        threads[reply.thread_id].append(reply)
+
+    return [{
+        **comment_item(root),
+        'reply_count'    : root.reply_count,
+        'replies'        : reply_items(threads[root.id]),
+        'replies_cursor' : encode_cursor(REPLY_SORT, threads[root.id][-1].create_at, threads[root.id][-1].id)
+                           if root.reply_count > len(threads[root.id]) else None
+        }for root in roots]
 
 class CommentView(View):
     @authorize_user
@@ -17,32 +81,66 @@ class CommentView(View):
             if not Posting.objects.filter(id = posting_id).exists():
                 return JsonResponse({'message': 'INVALID_POSTING_ID'}, status=400)
             
-            Comment.objects.create(
-            text       = data['text'], 
-            user       = request.user,
-            posting_id = posting_id
-            )
+            parent = None
+            if data.get('comment_id'):
+                parent = Comment.objects.filter(id=data['comment_id'], posting_id=posting_id).first()
+
+                if parent is None:
+                    return JsonResponse({'message': 'INVALID_COMMENT_ID'}, status=400)
+
+            with transaction.atomic():
+                comment = Comment.objects.create(
+                    text       = data['text'], 
+                    user       = request.user,
+                    posting_id = posting_id,
+                    comment    = parent,
+                    thread_id  = (parent.thread_id or parent.id) if parent else None
+                )
+                Posting.objects.filter(id=posting_id).update(
+                    score             = score_change(comments=1),
+                    comment_count     = F('comment_count')+1,
+                    comment_update_at = comment.update_at,
+                    **({} if parent else comment_preview(comment))
+                )
+                transaction.on_commit(feed_cache.counts_changed)
             return JsonResponse({'message': 'CREATED'}, status=201) 
         except KeyError:
             return JsonResponse({'message': 'INVALID_KEY_ERROR'}, status=400)
         
+    @method_decorator(condition(etag_func=comments_etag))
     def get(self, request):
         try:        
             posting_id = int(request.GET.get('posting_id', 0))
             limit      = int(request.GET.get('limit', 5))
             offset     = int(request.GET.get('offset',1))
+            cursor     = request.GET.get('cursor', None)
             offset     = limit*(offset-1)
-            comments = list(Comment.objects.filter(posting_id=posting_id).order_by('-create_at'))[offset:offset+limit]
-            result = [{
-                'id'            : comment.id,
-                'text'          : comment.text,
-                'create_at'     : str(comment.create_at)[:10],
-                'user_id'       : comment.user.id,
-                'user_nickname' : comment.user.nickname,
-                'user_profile'  : comment.user.profile_image
-                }for comment in comments]
+            sort       = '-create_at'
+            comments   = (
+                Comment.objects
+                .select_related('user')
+                .filter(posting_id=posting_id, thread__isnull=True)
+                .annotate(reply_count=Coalesce(Subquery(reply_count), 0), **reply_cutoff())
+            )
+
+            if cursor:
+                try:
+                    comments = comments.filter(keyset_filter(sort, *decode_cursor(cursor, sort)))
+                    offset   = 0
+                except (ValueError, TypeError, ValidationError):
+                    return JsonResponse({'message' : 'INVALID_CURSOR'}, status=400)
+
+            comments = comments.order_by(*keyset_order(sort))[offset:offset+limit]
+
+            if stream_requested(request, limit):
+                page = StreamedPage(comments, sort, limit)
+                return StreamingJsonResponse({'comment' : page.items(comment_threads), 'next_cursor' : page.next_cursor}, status=200)
+
+            comments    = list(comments)
+            result      = comment_threads(comments)
+            next_cursor = page_cursor(sort, limit, len(comments), comments[-1] if comments else None)
             
-            return JsonResponse({'comment' : result}, status=200)
+            return JsonResponse({'comment' : result, 'next_cursor' : next_cursor}, status=200)
         except KeyError:
             return JsonResponse({'message' : 'KEY_ERROR'}, status=400)
     
@@ -52,7 +150,14 @@ class CommentView(View):
             data = json.loads(request.body)
             comment = Comment.objects.get(id=comment_id)
             comment.text = data['text']
-            comment.save()
+
+            with transaction.atomic():
+                comment.save()
+                Posting.objects.filter(id=comment.posting_id).update(
+                    comment_update_at = comment.update_at,
+                    preview_text      = Case(When(preview_comment_id=comment.id, then=Value(comment.text)), default=F('preview_text'))
+                )
+                transaction.on_commit(feed_cache.counts_changed)
             
             return JsonResponse({'message': 'COMMENT_PATCH'}, status=200)
         except KeyError:
@@ -60,9 +165,34 @@ class CommentView(View):
     
     @authorize_user
     def delete(self, request, comment_id): 
-        comment = Comment.objects.get(
-            id = comment_id
-        )
-        comment.delete()
+        with transaction.atomic():
+            comment = Comment.objects.get(
+                id = comment_id
+            )
+            _, deleted = comment.delete()
+            Posting.objects.filter(id=comment.posting_id).update(
+                score             = score_change(comments=-deleted.get('comments.Comment', 0)),
+                comment_count     = F('comment_count')-deleted.get('comments.Comment', 0),
+                comment_update_at = timezone.now(),
+                **latest_comment_preview()
+            )
+            transaction.on_commit(feed_cache.counts_changed)
         
-        return JsonResponse({'message': 'DELETE_COMMNET'}, status=204)
\ No newline at end of file
+        return JsonResponse({'message': 'DELETE_COMMNET'}, status=204)
+
+class CommentRepliesView(View):
+    def get(self, request, comment_id):
+        limit   = int(request.GET.get('limit', settings.COMMENT_REPLIES_PER_THREAD))
+        cursor  = request.GET.get('cursor', None)
+        replies = Comment.objects.select_related('user').filter(thread_id=comment_id)
+
+        if cursor:
+            try:
+                replies = replies.filter(keyset_filter(REPLY_SORT, *decode_cursor(cursor, REPLY_SORT)))
+            except (ValueError, TypeError, ValidationError):
+                return JsonResponse({'message' : 'INVALID_CURSOR'}, status=400)
+
+        replies     = list(replies.order_by(*keyset_order(REPLY_SORT))[:limit])
+        next_cursor = page_cursor(REPLY_SORT, limit, len(replies), replies[-1] if replies else None)
+
+        return JsonResponse({'comment' : reply_items(replies), 'next_cursor' : next_cursor}, status=200)
@@ -0,0 +1,69 @@
+import io, threading, multiprocessing, logging, django
+
+from concurrent.futures import ProcessPoolExecutor
+from PIL                import Image, ImageOps
+
+from django.conf import settings
+from django.db   import close_old_connections
+
+from .models     import Posting
+from .utils      import get_s3_client
+from my_settings import AWS_STORAGE_BUCKET_NAME
+
+DERIVATIVES = (('thumb', 480), ('detail', 1280))
+FORMATS     = (('jpg', 'JPEG', 'image/jpeg'), ('webp', 'WEBP', 'image/webp'))
+
+logger = logging.getLogger(__name__)
+
+def render_derivatives(data):
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert('RGB')
+    files = {}
+
+    for name, width in DERIVATIVES:
+        resized = image.copy()
+        resized.thumbnail((width, width*4), Image.LANCZOS)
+
+        for extension, image_format, content_type in FORMATS:
+            output = io.BytesIO()
+            resized.save(output, image_format, quality=settings.IMAGE_DERIVATIVE_QUALITY, optimize=True)
+            files[f'{name}.{extension}'] = (output.getvalue(), content_type)
+
+    return files
+
+def build_derivatives(key):
+    s3_client = get_s3_client()
+    data      = s3_client.get_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=key)['Body'].read()
+
+    for suffix, (body, content_type) in render_derivatives(data).items():
+        s3_client.put_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=f'{key}_{suffix}', Body=body, ContentType=content_type)
+    return key
+
+def derivative_url(posting, name, extension='jpg'):
+    return f'{posting.image}_{name}.{extension}' if posting.has_derivatives else posting.image
+
+pool      = None
+pool_lock = threading.Lock()
+
+def get_pool():
+    global pool
+
+    with pool_lock:
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers = settings.IMAGE_DERIVATIVE_WORKERS,
+                mp_context  = multiprocessing.get_context('spawn'),
+                initializer = django.setup
+            )
+    return pool
+
+def schedule_derivatives(posting_id, key):
+    def mark_done(future):
+        error = future.exception()
+        if error is not None:
+            logger.error('derivative rendering failed for posting %s (%s)', posting_id, key, exc_info=error)
+            return
+
+        close_old_connections()
+        Posting.objects.filter(id=posting_id).update(has_derivatives=True)
+
+    get_pool().submit(build_derivatives, key).add_done_callback(mark_done)
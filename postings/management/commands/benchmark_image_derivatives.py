@@ -0,0 +1,44 @@
+import io, time, django, multiprocessing
+
+from concurrent.futures          import ProcessPoolExecutor
+from PIL                         import Image
+from django.core.management.base import BaseCommand
+
+from postings.images import render_derivatives
+
+def sample_image(width, height, seed):
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    image = Image.merge('RGB', [band.point(lambda value: (value*(seed+index+1)) % 256) for index, band in enumerate(image.split())])
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=90)
+    return output.getvalue()
+
+class Command(BaseCommand):
+    help = 'Measure how many uploads per second per core the image derivative pipeline renders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=40)
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--width', type=int, default=4032)
+        parser.add_argument('--height', type=int, default=3024)
+
+    def handle(self, *args, **options):
+        images = [sample_image(options['width'], options['height'], seed) for seed in range(options['images'])]
+
+        with ProcessPoolExecutor(
+            max_workers = options['workers'],
+            mp_context  = multiprocessing.get_context('spawn'),
+            initializer = django.setup
+        ) as pool:
+            list(pool.map(render_derivatives, images[:options['workers']]))
+
+            started = time.perf_counter()
+            list(pool.map(render_derivatives, images))
+            elapsed = time.perf_counter() - started
+
+        per_second = len(images) / elapsed
+        self.stdout.write(
+            f'{len(images)} images of {options["width"]}x{options["height"]} in {elapsed:.2f}s: '
+            f'{per_second:.2f} images/s, {per_second/options["workers"]:.2f} images/s per core '
+            f'({options["workers"]} workers)'
+        )
@@ -0,0 +1,82 @@
+import time, random, itertools
+
+from django.core.management.base import BaseCommand
+from django.db                   import transaction
+from django.db.models            import Max
+
+from postings.models import Posting, PostingTerm, HousingType, Size, Style, Color
+from postings.utils  import build_terms, search_relevance
+from users.models    import User
+
+def vocabulary(size, generator):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words   = {''.join(generator.choices(letters, k=7)) for _ in range(size)}
+    return sorted(words)
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway corpus and compare term-index search with text__icontains'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--postings', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--words', type=int, default=12, help='words per posting text')
+        parser.add_argument('--vocabulary', type=int, default=50000, help='distinct words, drawn with a Zipf distribution')
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--keep', action='store_true', help='keep the seeded rows instead of rolling back')
+
+    def seed(self, options, words):
+        user         = User.objects.create(email='benchmark@example.com', nickname='benchmark', kakao_id='0')
+        housing_type = HousingType.objects.create(type='benchmark')
+        size         = Size.objects.create(type='benchmark')
+        style        = Style.objects.create(type='benchmark')
+        color        = Color.objects.create(type='benchmark')
+        next_id      = (Posting.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        generator    = random.Random(0)
+        weights      = list(itertools.accumulate(1/rank for rank in range(1, len(words)+1)))
+
+        for start in range(0, options['postings'], options['batch_size']):
+            postings = [
+                Posting(
+                    id           = next_id + number,
+                    user         = user,
+                    housing_type = housing_type,
+                    size         = size,
+                    style        = style,
+                    back_color   = color,
+                    item_color   = color,
+                    image        = 'benchmark',
+                    text         = ' '.join(generator.choices(words, cum_weights=weights, k=options['words'])),
+                    update_at    = '2021-06-28'
+                )
+                for number in range(start, min(start+options['batch_size'], options['postings']))]
+            Posting.objects.bulk_create(postings)
+            PostingTerm.objects.bulk_create(build_terms(postings), batch_size=options['batch_size'])
+
+    def measure(self, queryset_for, queries):
+        started = time.perf_counter()
+        for query in queries:
+            list(queryset_for(query)[:8])
+        return (time.perf_counter() - started) / len(queries) * 1000
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            words   = vocabulary(options['vocabulary'], random.Random(0))
+            started = time.perf_counter()
+            self.seed(options, words)
+            self.stdout.write(f'seeded {options["postings"]} postings in {time.perf_counter()-started:.1f}s')
+
+            generator = random.Random(1)
+            queries   = [' '.join(generator.sample(words[1000:], 2)) for _ in range(options['queries'])]
+
+            def term_index(query):
+                matched, relevance = search_relevance(query)
+                return Posting.objects.filter(matched).annotate(relevance=relevance).order_by('-relevance', '-id')
+
+            def icontains(query):
+                return Posting.objects.filter(text__icontains=query.split()[0]).order_by('-id')
+
+            self.stdout.write(f'term index: {self.measure(term_index, queries):.1f} ms/query')
+            self.stdout.write(f'icontains : {self.measure(icontains, queries):.1f} ms/query')
+
+            if not options['keep']:
+                transaction.set_rollback(True)
@@ -0,0 +1,39 @@
+import django, multiprocessing
+
+from concurrent.futures          import ProcessPoolExecutor, as_completed
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+
+from postings.images import build_derivatives
+from postings.models import Posting
+from my_settings     import AWS_S3_CUSTOM_DOMAIN
+
+class Command(BaseCommand):
+    help = 'Render feed and detail image derivatives for postings that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_DERIVATIVE_WORKERS)
+
+    def handle(self, *args, **options):
+        postings = Posting.objects.filter(has_derivatives=False, image__startswith=AWS_S3_CUSTOM_DOMAIN)
+        built    = 0
+
+        with ProcessPoolExecutor(
+            max_workers = options['workers'],
+            mp_context  = multiprocessing.get_context('spawn'),
+            initializer = django.setup
+        ) as pool:
+            futures = {
+                pool.submit(build_derivatives, image[len(AWS_S3_CUSTOM_DOMAIN):]): posting_id
+                for posting_id, image in postings.values_list('id', 'image').iterator()
+            }
+
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    self.stderr.write(f'posting {futures[future]}: {future.exception()}')
+                    continue
+
+                Posting.objects.filter(id=futures[future]).update(has_derivatives=True)
+                built += 1
+
+        self.stdout.write(f'{built} postings built')
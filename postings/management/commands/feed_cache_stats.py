@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from postings.utils import feed_cache
+
+class Command(BaseCommand):
+    help = 'Print hit/miss counters of the feed page cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the counters and invalidate cached pages')
+
+    def handle(self, *args, **options):
+        stats = feed_cache.stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+
+        self.stdout.write(f"hits {stats['hits']} misses {stats['misses']} hit ratio {ratio:.2%}")
+
+        if options['reset']:
+            feed_cache.clear()
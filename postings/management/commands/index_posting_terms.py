@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db                   import transaction
+
+from postings.models     import Posting, PostingTerm
+from postings.utils      import build_terms
+from yourhousetoday.http import chunked
+
+class Command(BaseCommand):
+    help = 'Rebuild the posting_terms search index from postings.text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        postings = Posting.objects.only('id', 'text').order_by('id').iterator(chunk_size=options['batch_size'])
+        indexed  = 0
+
+        for chunk in chunked(postings, options['batch_size']):
+            with transaction.atomic():
+                PostingTerm.objects.filter(posting_id__in=[posting.id for posting in chunk]).delete()
+                PostingTerm.objects.bulk_create(build_terms(chunk), batch_size=options['batch_size'])
+            indexed += len(chunk)
+
+        self.stdout.write(f'{indexed} postings indexed')
@@ -0,0 +1,32 @@
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+from django.db                   import transaction
+from django.db.models            import Count, Max, OuterRef, Subquery
+from django.db.models.functions  import Coalesce
+
+from postings.models import Posting, Like
+from postings.utils  import feed_cache, latest_comment_preview, rebuild_scores
+from comments.models import Comment
+
+class Command(BaseCommand):
+    help = 'Rebuild like_count, comment_count, comment_update_at, score and the comment preview of every posting from the likes and comments tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.POPULAR_SCORE_BATCH)
+
+    def handle(self, *args, **options):
+        likes    = Like.objects.filter(posting=OuterRef('pk')).values('posting').annotate(count=Count('id')).values('count')
+        comments = Comment.objects.filter(posting=OuterRef('pk')).values('posting').annotate(count=Count('id')).values('count')
+        updates  = Comment.objects.filter(posting=OuterRef('pk')).values('posting').annotate(last=Max('update_at')).values('last')
+
+        with transaction.atomic():
+            updated = Posting.objects.update(
+                like_count        = Coalesce(Subquery(likes), 0),
+                comment_count     = Coalesce(Subquery(comments), 0),
+                comment_update_at = Subquery(updates),
+                **latest_comment_preview()
+            )
+            rebuild_scores(options['batch_size'])
+            transaction.on_commit(feed_cache.invalidate)
+
+        self.stdout.write(f'{updated} postings rebuilt')
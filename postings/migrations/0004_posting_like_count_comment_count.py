@@ -0,0 +1,41 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counts(apps, schema_editor):
+    Posting = apps.get_model('postings', 'Posting')
+    Like    = apps.get_model('postings', 'Like')
+    Comment = apps.get_model('comments', 'Comment')
+
+    likes    = Like.objects.filter(posting=OuterRef('pk')).values('posting').annotate(count=Count('id')).values('count')
+    comments = Comment.objects.filter(posting=OuterRef('pk')).values('posting').annotate(count=Count('id')).values('count')
+
+    Posting.objects.update(
+        like_count    = Coalesce(Subquery(likes), 0),
+        comment_count = Coalesce(Subquery(comments), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0002_auto_20210623_0408'),
+        ('postings', '0003_auto_20210623_0408'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posting',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='posting',
+            name='like_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
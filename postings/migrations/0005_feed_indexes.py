@@ -0,0 +1,53 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postings', '0004_posting_like_count_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['create_at'], name='postings_create_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['housing_type', 'create_at'], name='postings_housing_create_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['style', 'create_at'], name='postings_style_create_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['back_color', 'create_at'], name='postings_back_color_create_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['item_color', 'create_at'], name='postings_item_color_create_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['view'], name='postings_view_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['housing_type', 'view'], name='postings_housing_view_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['style', 'view'], name='postings_style_view_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['back_color', 'view'], name='postings_back_color_view_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['item_color', 'view'], name='postings_item_color_view_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postings', '0005_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posting',
+            name='has_derivatives',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:29
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    Posting = apps.get_model('postings', 'Posting')
+    Like    = apps.get_model('postings', 'Like')
+
+    duplicates  = Like.objects.values('user', 'posting').annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1)
+    posting_ids = set()
+
+    for duplicate in duplicates:
+        Like.objects.filter(user=duplicate['user'], posting=duplicate['posting']).exclude(id=duplicate['keep']).delete()
+        posting_ids.add(duplicate['posting'])
+
+    likes = Like.objects.filter(posting=OuterRef('pk')).values('posting').annotate(count=Count('id')).values('count')
+    Posting.objects.filter(id__in=posting_ids).update(like_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postings', '0006_posting_has_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('user', 'posting'), name='likes_user_posting_unique'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postings', '0007_like_user_posting_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posting',
+            name='score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['score'], name='postings_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['housing_type', 'score'], name='postings_housing_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['style', 'score'], name='postings_style_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['back_color', 'score'], name='postings_back_color_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='posting',
+            index=models.Index(fields=['item_color', 'score'], name='postings_item_color_score_idx'),
+        ),
+    ]
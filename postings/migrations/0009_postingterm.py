@@ -0,0 +1,30 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postings', '0008_posting_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostingTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=1)),
+                ('posting', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='postings.posting')),
+            ],
+            options={
+                'db_table': 'posting_terms',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postingterm',
+            constraint=models.UniqueConstraint(fields=('term', 'posting'), name='posting_terms_term_posting_unique'),
+        ),
+    ]
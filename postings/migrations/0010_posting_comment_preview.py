@@ -0,0 +1,49 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:47
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_previews(apps, schema_editor):
+    Posting = apps.get_model('postings', 'Posting')
+    Comment = apps.get_model('comments', 'Comment')
+    latest  = Comment.objects.filter(posting=OuterRef('pk'), thread__isnull=True).order_by('-create_at', '-id')
+
+    Posting.objects.update(
+        preview_comment       = Subquery(latest.values('id')[:1]),
+        preview_text          = Subquery(latest.values('text')[:1]),
+        preview_nickname      = Subquery(latest.values('user__nickname')[:1]),
+        preview_profile_image = Subquery(latest.values('user__profile_image')[:1])
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0004_comment_thread'),
+        ('postings', '0009_postingterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posting',
+            name='preview_comment',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='comments.comment'),
+        ),
+        migrations.AddField(
+            model_name='posting',
+            name='preview_nickname',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='posting',
+            name='preview_profile_image',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='posting',
+            name='preview_text',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.RunPython(fill_previews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:55
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def fill_comment_update_at(apps, schema_editor):
+    Posting = apps.get_model('postings', 'Posting')
+    Comment = apps.get_model('comments', 'Comment')
+    last    = Comment.objects.filter(posting=OuterRef('pk')).values('posting').annotate(last=Max('update_at')).values('last')
+
+    Posting.objects.update(comment_update_at=Subquery(last))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0004_comment_thread'),
+        ('postings', '0010_posting_comment_preview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posting',
+            name='comment_update_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_comment_update_at, migrations.RunPython.noop),
+    ]
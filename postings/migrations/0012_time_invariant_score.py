@@ -0,0 +1,37 @@
+import datetime, math
+
+from django.conf import settings
+from django.db import migrations
+
+
+def fill_scores(apps, schema_editor):
+    Posting = apps.get_model('postings', 'Posting')
+    epoch   = datetime.datetime(2021, 6, 1, tzinfo=datetime.timezone.utc)
+    last_id = 0
+
+    while True:
+        postings = list(Posting.objects.filter(id__gt=last_id).order_by('id')[:1000])
+        if not postings:
+            return
+
+        for posting in postings:
+            weight = (
+                posting.view * settings.POPULAR_VIEW_WEIGHT
+                + posting.like_count * settings.POPULAR_LIKE_WEIGHT
+                + posting.comment_count * settings.POPULAR_COMMENT_WEIGHT
+            )
+            posting.score = math.log2(max(weight, 1)) + (posting.create_at - epoch).total_seconds() / settings.POPULAR_HALF_LIFE
+
+        Posting.objects.bulk_update(postings, ['score'])
+        last_id = postings[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postings', '0011_posting_comment_update_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
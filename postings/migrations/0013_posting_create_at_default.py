@@ -0,0 +1,19 @@
+# Generated by Django 3.2.4 on 2026-10-18 15:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('postings', '0012_time_invariant_score'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='posting',
+            name='create_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,29 +1,77 @@
-from django.db import models
+from django.db    import models
+from django.utils import timezone
+
+from .scoring import popularity, posting_score
 
 class Posting(models.Model):
-    housing_type = models.ForeignKey('HousingType', on_delete=models.CASCADE)
-    item_color   = models.ForeignKey('Color', on_delete=models.CASCADE,related_name='posting_item_color')
-    size         = models.ForeignKey('Size', on_delete=models.CASCADE)
-    style        = models.ForeignKey('Style', on_delete=models.CASCADE)
-    user         = models.ForeignKey('users.User', on_delete=models.CASCADE,related_name='posting') 
-    back_color   = models.ForeignKey('Color', on_delete=models.CASCADE,related_name='posting_back_color')
-    like         = models.ManyToManyField('users.User', through='Like',related_name='posting_like')
-    image        = models.CharField(max_length=200)
-    text         = models.TextField()
-    create_at    = models.DateTimeField(auto_now_add=True)
-    update_at    = models.DateTimeField()
-    view         = models.IntegerField(default=0)
+    housing_type          = models.ForeignKey('HousingType', on_delete=models.CASCADE)
+    item_color            = models.ForeignKey('Color', on_delete=models.CASCADE,related_name='posting_item_color')
+    size                  = models.ForeignKey('Size', on_delete=models.CASCADE)
+    style                 = models.ForeignKey('Style', on_delete=models.CASCADE)
+    user                  = models.ForeignKey('users.User', on_delete=models.CASCADE,related_name='posting') 
+    back_color            = models.ForeignKey('Color', on_delete=models.CASCADE,related_name='posting_back_color')
+    like                  = models.ManyToManyField('users.User', through='Like',related_name='posting_like')
+    image                 = models.CharField(max_length=200)
+    text                  = models.TextField()
+    create_at             = models.DateTimeField(default=timezone.now, editable=False)
+    update_at             = models.DateTimeField()
+    view                  = models.IntegerField(default=0)
+    like_count            = models.IntegerField(default=0)
+    comment_count         = models.IntegerField(default=0)
+    comment_update_at     = models.DateTimeField(null=True)
+    has_derivatives       = models.BooleanField(default=False)
+    score                 = models.FloatField(default=0)
+    preview_comment       = models.ForeignKey('comments.Comment', on_delete=models.SET_NULL, null=True, related_name='+')
+    preview_text          = models.CharField(max_length=100, null=True)
+    preview_nickname      = models.CharField(max_length=50, null=True)
+    preview_profile_image = models.CharField(max_length=200, null=True)
    
     class Meta:
         db_table = 'postings'
+        indexes  = [
+            models.Index(fields=['create_at'], name='postings_create_idx'),
+            models.Index(fields=['housing_type', 'create_at'], name='postings_housing_create_idx'),
+            models.Index(fields=['style', 'create_at'], name='postings_style_create_idx'),
+            models.Index(fields=['back_color', 'create_at'], name='postings_back_color_create_idx'),
+            models.Index(fields=['item_color', 'create_at'], name='postings_item_color_create_idx'),
+            models.Index(fields=['view'], name='postings_view_idx'),
+            models.Index(fields=['housing_type', 'view'], name='postings_housing_view_idx'),
+            models.Index(fields=['style', 'view'], name='postings_style_view_idx'),
+            models.Index(fields=['back_color', 'view'], name='postings_back_color_view_idx'),
+            models.Index(fields=['item_color', 'view'], name='postings_item_color_view_idx'),
+            models.Index(fields=['score'], name='postings_score_idx'),
+            models.Index(fields=['housing_type', 'score'], name='postings_housing_score_idx'),
+            models.Index(fields=['style', 'score'], name='postings_style_score_idx'),
+            models.Index(fields=['back_color', 'score'], name='postings_back_color_score_idx'),
+            models.Index(fields=['item_color', 'score'], name='postings_item_color_score_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.score:
+            self.score = posting_score(popularity(self.view, self.like_count, self.comment_count), self.create_at)
+        super().save(*args, **kwargs)
         
 class Like(models.Model):
     user    =  models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='like' )
     posting =  models.ForeignKey(Posting, on_delete=models.CASCADE, related_name='like_posting') 
     
     class Meta:
-        db_table = 'likes'
+        db_table    = 'likes'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'posting'], name='likes_user_posting_unique'),
+        ]
         
+class PostingTerm(models.Model):
+    posting = models.ForeignKey(Posting, on_delete=models.CASCADE, related_name='terms')
+    term    = models.CharField(max_length=50)
+    count   = models.IntegerField(default=1)
+
+    class Meta:
+        db_table    = 'posting_terms'
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'posting'], name='posting_terms_term_posting_unique'),
+        ]
+
 class HousingType(models.Model):
     type =  models.CharField(max_length=45)
     
@@ -0,0 +1,15 @@
+import math, datetime
+
+from django.conf import settings
+
+SCORE_EPOCH = datetime.datetime(2021, 6, 1, tzinfo=datetime.timezone.utc)
+
+def popularity(views=0, likes=0, comments=0):
+    return (
+        views * settings.POPULAR_VIEW_WEIGHT
+        + likes * settings.POPULAR_LIKE_WEIGHT
+        + comments * settings.POPULAR_COMMENT_WEIGHT
+    )
+
+def posting_score(weight, create_at):
+    return math.log2(max(weight, 1)) + (create_at - SCORE_EPOCH).total_seconds() / settings.POPULAR_HALF_LIFE
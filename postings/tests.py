@@ -1,16 +1,31 @@
-import json, jwt
+import re, json, jwt, math, datetime
 
-from unittest.mock      import patch, MagicMock
-from django.test        import TestCase, Client
-from django.core.files  import File
+from io                             import StringIO, BytesIO
+from PIL                            import Image
+from unittest.mock                  import patch, MagicMock
+from botocore.exceptions            import ClientError
+from concurrent.futures             import Future
+from django.test                    import TestCase, Client, override_settings
+from django.core.files              import File
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management         import call_command
+from django.db                      import connection, DatabaseError
+from django.db.models               import F
+from django.test.utils              import CaptureQueriesContext
+from django.utils                   import timezone
 
-from postings.models import Posting, HousingType, Style, Size, Color, Like
-from users.models    import User
-from comments.models import Comment
-from my_settings import SECRET_KEY, ALGORITHM
+from postings.models  import Posting, PostingTerm, HousingType, Style, Size, Color, Like
+from postings.utils   import encode_cursor, ViewCounter, view_counter, lookup_tables, get_s3_client, feed_cache, latest_comment_preview
+from postings.scoring import posting_score
+from postings.views   import SORTS
+from postings.images  import render_derivatives, derivative_url, schedule_derivatives
+from users.models     import User
+from comments.models  import Comment
+from my_settings import SECRET_KEY, ALGORITHM, AWS_S3_CUSTOM_DOMAIN
 
 class PostingsViewTest(TestCase):
     def setUp(self):
+        feed_cache.clear()
         posting_user = User.objects.create(
             id            = 1,
             email         = 'asdf@naver.com', 
@@ -38,30 +53,34 @@ class PostingsViewTest(TestCase):
         size_10   = Size.objects.create(id=1, type='10')
         size_20   = Size.objects.create(id=2, type='20')
         posting_1 = Posting.objects.create(
-            id           = 1,
-            user         = posting_user,
-            housing_type = housing_type_one_room,
-            size         = size_10,
-            style        = style_modern,
-            item_color   = item_color_red,
-            back_color   = back_color_black,
-            image        = 'posting_image_url',
-            text         = '너무 이쁜집',
-            update_at    = '2020-12-11',
-            view         = 10
+            id            = 1,
+            user          = posting_user,
+            housing_type  = housing_type_one_room,
+            size          = size_10,
+            style         = style_modern,
+            item_color    = item_color_red,
+            back_color    = back_color_black,
+            image         = 'posting_image_url',
+            text          = '너무 이쁜집',
+            update_at     = '2020-12-11',
+            view          = 10,
+            like_count    = 1,
+            comment_count = 1
             )
         posting_2 = Posting.objects.create(
-            id           = 2,
-            user         = posting_user,
-            housing_type = housing_type_apart,
-            size         = size_20,
-            style        = style_classic,
-            item_color   = item_color_blue,
-            back_color   = back_color_white,
-            image        = 'posting_image_url',
-            text         = '너무 이쁜집',
-            update_at    = '2021-10-20',
-            view         = 20
+            id            = 2,
+            user          = posting_user,
+            housing_type  = housing_type_apart,
+            size          = size_20,
+            style         = style_classic,
+            item_color    = item_color_blue,
+            back_color    = back_color_white,
+            image         = 'posting_image_url',
+            text          = '너무 이쁜집',
+            update_at     = '2021-10-20',
+            view          = 20,
+            like_count    = 1,
+            comment_count = 1
             )
         Posting.objects.create(
             id           = 3,
@@ -91,6 +110,7 @@ class PostingsViewTest(TestCase):
             )
         Comment.objects.create(id=1, posting=posting_1, user=comment_user, text='너무 이쁘네요')
         Comment.objects.create(id=2, posting=posting_2, user=comment_user, text='너무 보기 좋아요')
+        Posting.objects.update(**latest_comment_preview())
         Like.objects.create(id=1, user=comment_user, posting=posting_1)
         Like.objects.create(id=2, user=comment_user, posting=posting_2)
     
@@ -117,12 +137,14 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '너무 이쁜집', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 10, 
                     'heartCount': 1, 
                     'commentCount': 1, 
                     'writerImage': ['profile_image_url'], 
                     'writerName': ['아이언맨'], 
-                    'commentContent': ['너무 이쁘네요']
+                    'commentContent': ['너무 이쁘네요'],
+                    'likedByMe': False
                 },
                 {
                     'id': 2, 
@@ -131,12 +153,14 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '너무 이쁜집', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 20, 
                     'heartCount': 1, 
                     'commentCount': 1, 
                     'writerImage': ['profile_image_url'], 
                     'writerName': ['아이언맨'], 
-                    'commentContent': ['너무 보기 좋아요']
+                    'commentContent': ['너무 보기 좋아요'],
+                    'likedByMe': False
                 },
                 {
                     'id': 3, 
@@ -145,12 +169,14 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '제 방을 소개합니다', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 11, 
                     'heartCount': 0, 
                     'commentCount': 0, 
                     'writerImage': '', 
                     'writerName': '', 
-                    'commentContent': ''
+                    'commentContent': '',
+                    'likedByMe': False
                 },
                 {
                     'id': 4, 
@@ -159,15 +185,18 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '자랑합니다', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 24, 
                     'heartCount': 0, 
                     'commentCount': 0, 
                     'writerImage': '', 
                     'writerName': '', 
-                    'commentContent': ''
+                    'commentContent': '',
+                    'likedByMe': False
                 }
 
-            ]
+            ],
+            'next_cursor': None
         })
         
     def test_postings_list_filter_success(self):
@@ -184,12 +213,14 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '너무 이쁜집', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 20, 
                     'heartCount': 1, 
                     'commentCount': 1, 
                     'writerImage': ['profile_image_url'], 
                     'writerName': ['아이언맨'], 
-                    'commentContent': ['너무 보기 좋아요']
+                    'commentContent': ['너무 보기 좋아요'],
+                    'likedByMe': False
                 },
                 {
                     'id': 3, 
@@ -198,16 +229,27 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '제 방을 소개합니다', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 11, 
                     'heartCount': 0, 
                     'commentCount': 0, 
                     'writerImage': '', 
                     'writerName': '', 
-                    'commentContent': ''
+                    'commentContent': '',
+                    'likedByMe': False
                 }
-            ]
+            ],
+            'next_cursor': None
         })
         
+    def test_postings_list_filter_by_type_name(self):
+        client   = Client()
+        response = client.get('/postings?style=classic&housing-type=apartment')
+        self.assertEqual([posting['id'] for posting in response.json()['result']], [2, 3])
+
+        response = client.get('/postings?style=unknown')
+        self.assertEqual(response.json()['result'], [])
+
     def test_postings_list_order_by_success(self):
         client   = Client()
         response = client.get('/postings?sort=-view')
@@ -222,12 +264,14 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '자랑합니다', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 24, 
                     'heartCount': 0, 
                     'commentCount': 0, 
                     'writerImage': '', 
                     'writerName': '', 
-                    'commentContent': ''
+                    'commentContent': '',
+                    'likedByMe': False
                 },
                 {
                     'id': 2, 
@@ -236,12 +280,14 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '너무 이쁜집', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 20, 
                     'heartCount': 1, 
                     'commentCount': 1, 
                     'writerImage': ['profile_image_url'], 
                     'writerName': ['아이언맨'], 
-                    'commentContent': ['너무 보기 좋아요']
+                    'commentContent': ['너무 보기 좋아요'],
+                    'likedByMe': False
                 },
                 {
                     'id': 3, 
@@ -250,12 +296,14 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '제 방을 소개합니다', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 11, 
                     'heartCount': 0, 
                     'commentCount': 0, 
                     'writerImage': '', 
                     'writerName': '', 
-                    'commentContent': ''
+                    'commentContent': '',
+                    'likedByMe': False
                 },
                 {
                     'id': 1, 
@@ -264,22 +312,25 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '너무 이쁜집', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 10, 
                     'heartCount': 1, 
                     'commentCount': 1, 
                     'writerImage': ['profile_image_url'], 
                     'writerName': ['아이언맨'], 
-                    'commentContent': ['너무 이쁘네요']
+                    'commentContent': ['너무 이쁘네요'],
+                    'likedByMe': False
                 }
-            ]
+            ],
+            'next_cursor': None
         })
         
     def test_postings_list_page_get(self):
         client   = Client()
         response = client.get('/postings?limit=2&offset=1')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json(), {
-            'result': 
+        self.assertIsNotNone(response.json()['next_cursor'])
+        self.assertEqual(response.json()['result'], 
             [
                 {
                     'id': 1, 
@@ -288,12 +339,14 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '너무 이쁜집', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 10, 
                     'heartCount': 1, 
                     'commentCount': 1, 
                     'writerImage': ['profile_image_url'], 
                     'writerName': ['아이언맨'], 
-                    'commentContent': ['너무 이쁘네요']
+                    'commentContent': ['너무 이쁘네요'],
+                    'likedByMe': False
                 },
                 {
                     'id': 2, 
@@ -302,17 +355,301 @@ class PostingsViewTest(TestCase):
                     'introduce': 'hello wecode', 
                     'title': '너무 이쁜집', 
                     'cardImage': 'posting_image_url', 
+                    'cardImageWebp': 'posting_image_url', 
                     'viewCount': 20, 
                     'heartCount': 1, 
                     'commentCount': 1, 
                     'writerImage': ['profile_image_url'], 
                     'writerName': ['아이언맨'], 
-                    'commentContent': ['너무 보기 좋아요']
+                    'commentContent': ['너무 보기 좋아요'],
+                    'likedByMe': False
                 }
-            ]
-        })
-    @patch('postings.views.boto3.client')
+            ])
+
+    def test_postings_list_cursor_page_get(self):
+        client      = Client()
+        first_page  = client.get('/postings?limit=2&sort=-view').json()
+        second_page = client.get(f'/postings?limit=2&sort=-view&cursor={first_page["next_cursor"]}').json()
+        self.assertEqual([posting['id'] for posting in first_page['result']], [4, 2])
+        self.assertEqual([posting['id'] for posting in second_page['result']], [3, 1])
+        self.assertEqual(client.get('/postings?limit=2&offset=2&sort=-view').json(), second_page)
+
+        last_page = client.get(f'/postings?limit=2&sort=-view&cursor={second_page["next_cursor"]}').json()
+        self.assertEqual(last_page, {'result': [], 'next_cursor': None})
+
+    def test_postings_list_invalid_cursor(self):
+        client   = Client()
+        response = client.get('/postings?cursor=wrong_cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'INVALID_CURSOR'})
+
+        cursor   = client.get('/postings?limit=1&sort=-view').json()['next_cursor']
+        response = client.get(f'/postings?cursor={cursor}')
+        self.assertEqual(response.status_code, 400)
+
+    def test_postings_list_tampered_cursor_value(self):
+        client = Client()
+        for sort, order, value in [('create_at', 'create_at', 'garbage'), ('-view', '-view', 'abc'), ('popular', '-score', 'x'), ('-view', '-view', [1])]:
+            response = client.get(f'/postings?sort={sort}&cursor={encode_cursor(order, value, 1)}')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message': 'INVALID_CURSOR'})
+
+    def test_postings_list_invalid_sort(self):
+        response = Client().get('/postings?sort=text')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'INVALID_SORT'})
+
+    def test_postings_list_popular_sort(self):
+        Posting.objects.filter(id=3).update(create_at=timezone.now()-datetime.timedelta(days=30))
+        Posting.objects.filter(id__in=[1, 3]).update(view=1000)
+        call_command('rebuild_posting_counts', '--batch-size=3', stdout=StringIO())
+
+        client     = Client()
+        first_page = client.get('/postings?sort=popular&limit=2').json()
+        last_page  = client.get(f'/postings?sort=popular&limit=2&cursor={first_page["next_cursor"]}').json()
+        self.assertEqual([card['id'] for card in first_page['result']], [1, 2])
+        self.assertEqual([card['id'] for card in last_page['result']], [4, 3])
+
+    def test_new_posting_starts_at_its_time_baseline(self):
+        posting = Posting.objects.get(id=2)
+        self.assertAlmostEqual(posting.score, posting_score(35, posting.create_at))
+
+        posting.pk, posting.score, posting.create_at = None, 0, timezone.now()-datetime.timedelta(days=30)
+        posting._state.adding = True
+        posting.save()
+        self.assertAlmostEqual(Posting.objects.get(id=posting.id).score, posting_score(35, posting.create_at))
+
+    def test_like_and_comment_change_score(self):
+        Posting.objects.filter(id=2).update(create_at=timezone.now()-datetime.timedelta(days=300), score=posting_score(35, timezone.now()-datetime.timedelta(days=300)))
+        baseline     = Posting.objects.get(id=2).score
+        access_token = jwt.encode({'id': 1}, SECRET_KEY, ALGORITHM)
+        client       = Client()
+
+        client.post('/postings/like/2', HTTP_Authorization=access_token)
+        client.post('/comments?posting_id=2', json.dumps({'text': '좋아요'}), content_type='application/json', HTTP_Authorization=access_token)
+        self.assertAlmostEqual(Posting.objects.get(id=2).score, baseline + math.log2(50/35))
+
+        client.delete('/postings/like/2', HTTP_Authorization=access_token)
+        self.assertAlmostEqual(Posting.objects.get(id=2).score, baseline + math.log2(40/35))
+
+        Posting.objects.filter(id=2).update(view=0, like_count=0, comment_count=1)
+        client.delete(f'/comments/{Comment.objects.get(text="좋아요").id}', HTTP_Authorization=access_token)
+        self.assertAlmostEqual(Posting.objects.get(id=2).score, baseline + math.log2(40/35) - math.log2(5))
+        self.assertGreater(Posting.objects.get(id=2).score, 0)
+
+    def test_postings_list_search(self):
+        for posting_id, text in ((2, '화이트 주방 화이트 수납'), (4, '화이트 거실')):
+            posting      = Posting.objects.get(id=posting_id)
+            posting.text = text
+            posting.save()
+
+        client = Client()
+        self.assertEqual([card['id'] for card in client.get('/postings?search=화이트 주방').json()['result']], [2, 4])
+        self.assertEqual([card['id'] for card in client.get('/postings?search=화이트&style=modern').json()['result']], [4])
+        self.assertEqual([card['id'] for card in client.get('/postings?search=이쁜').json()['result']], [1])
+        self.assertEqual(client.get('/postings?search=없는단어').json()['result'], [])
+        self.assertEqual(client.get('/postings?sort=relevance').status_code, 400)
+
+        first_page = client.get('/postings?search=화이트&limit=1').json()
+        last_page  = client.get(f'/postings?search=화이트&limit=1&cursor={first_page["next_cursor"]}').json()
+        self.assertEqual([card['id'] for card in first_page['result'] + last_page['result']], [2, 4])
+
+    def test_index_posting_terms_command(self):
+        PostingTerm.objects.all().delete()
+        call_command('index_posting_terms', '--batch-size=3', stdout=StringIO())
+        self.assertEqual(
+            set(PostingTerm.objects.filter(posting_id=1).values_list('term', flat=True)),
+            {'너무', '이쁜집', '이쁜', '쁜집'}
+        )
+
+    def test_postings_list_explain_uses_index(self):
+        if connection.vendor not in ('mysql', 'sqlite'):
+            self.skipTest('EXPLAIN output is only checked on MySQL and SQLite')
+
+        Posting.objects.bulk_create([
+            Posting(
+                user_id         = 1,
+                housing_type_id = number%2+1,
+                size_id         = number%2+1,
+                style_id        = number%2+1,
+                item_color_id   = number%2+1,
+                back_color_id   = number%2+3,
+                image           = 'posting_image_url',
+                text            = 'text',
+                update_at       = '2021-06-28',
+                view            = number
+            )
+            for number in range(300)])
+
+        filters = [
+            '',
+            '&housing-type=1',
+            '&style=1',
+            '&back-color=3',
+            '&item-color=1',
+            '&style=1&housing-type=2',
+            '&style=1&min-size=10&max-size=20',
+        ]
+        for sort in SORTS:
+            for filter in filters:
+                with CaptureQueriesContext(connection) as queries:
+                    Client().get(f'/postings?sort={sort}{filter}')
+                sql = next(query['sql'] for query in queries if re.search(r'FROM [`"]postings[`"]', query['sql']))
+                with connection.cursor() as cursor:
+                    if connection.vendor == 'mysql':
+                        cursor.execute('EXPLAIN ' + sql)
+                        columns = [column[0] for column in cursor.description]
+                        plans   = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                        plan    = next(plan for plan in plans if plan['table'] == 'postings')
+                        bad     = plan['type'] == 'ALL' or 'Using filesort' in (plan['Extra'] or '')
+                    else:
+                        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                        plan = [row[3] for row in cursor.fetchall()]
+                        bad  = 'USE TEMP B-TREE FOR ORDER BY' in plan or 'SCAN postings' in plan
+                self.assertFalse(bad, f'sort={sort}{filter}: {plan}')
+
+    def test_postings_list_query_count(self):
+        client = Client()
+        with self.assertNumQueries(1):
+            client.get('/postings?limit=2')
+        with self.assertNumQueries(1):
+            client.get('/postings?limit=8')
+
+    def test_postings_list_cache_hit(self):
+        client = Client()
+        first  = client.get('/postings?style=modern&limit=2')
+        with self.assertNumQueries(0):
+            second = client.get('/postings?limit=2&style=modern')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(feed_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_postings_list_cache_invalidated_by_like(self):
+        client       = Client()
+        access_token = jwt.encode({'id': 2}, SECRET_KEY, ALGORITHM)
+        Like.objects.filter(user_id=2, posting_id=1).delete()
+        client.get('/postings')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/postings/like/1', HTTP_Authorization=access_token)
+
+        response = client.get('/postings')
+        self.assertEqual(feed_cache.stats()['misses'], 2)
+        self.assertEqual(response.json()['result'][0]['heartCount'], Posting.objects.get(id=1).like_count)
+
+    @patch('postings.views.schedule_derivatives')
+    @patch('postings.utils.boto3.client')
+    def test_postings_list_cache_invalidated_by_writing(self, mock_s3client, mock_schedule):
+        get_s3_client.cache_clear()
+        client       = Client()
+        access_token = jwt.encode({'id': 1}, SECRET_KEY, ALGORITHM)
+        before       = len(client.get('/postings').json()['result'])
+        info         = json.dumps({
+            'housing_type' : 'one_room',
+            'size'         : '10',
+            'style'        : 'modern',
+            'back_color'   : 'black',
+            'item_color'   : 'red',
+            'text'         : 'test'
+            })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image = SimpleUploadedFile('img.jpg', b'image', content_type='image/jpeg')
+            client.post('/postings', {'image': image, 'info': info}, HTTP_Authorization=access_token)
+
+        self.assertEqual(len(client.get('/postings').json()['result']), before+1)
+        get_s3_client.cache_clear()
+
+    def test_postings_list_not_modified(self):
+        client   = Client()
+        response = client.get('/postings')
+        etag     = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = client.get('/postings', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        feed_cache.invalidate()
+        self.assertEqual(client.get('/postings', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Posting.objects.filter(id=1).update(text='바뀐 제목')
+        feed_cache.invalidate()
+        self.assertEqual(client.get('/postings', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(STREAM_THRESHOLD=1, STREAM_BUFFER_SIZE=64)
+    def test_postings_list_stream(self):
+        client   = Client()
+        response = client.get('/postings?limit=2')
+        chunks   = list(response.streaming_content)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(feed_cache.stats(), {'hits': 0, 'misses': 0})
+        self.assertEqual(b''.join(chunks), client.get('/postings?limit=2&stream=0').content)
+        self.assertEqual(feed_cache.stats(), {'hits': 0, 'misses': 1})
+        self.assertIsNotNone(json.loads(b''.join(chunks))['next_cursor'])
+
+    def test_postings_list_liked_by_me(self):
+        client       = Client()
+        access_token = jwt.encode({'id': 2}, SECRET_KEY, ALGORITHM)
+        Like.objects.filter(id=2).delete()
+        anonymous    = client.get('/postings')
+
+        with self.assertNumQueries(2):
+            response = client.get('/postings', HTTP_Authorization=access_token)
+        liked = {card['id']: card['likedByMe'] for card in response.json()['result']}
+        self.assertEqual(liked, {1: True, 2: False, 3: False, 4: False})
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertEqual([card['likedByMe'] for card in client.get('/postings').json()['result']], [False]*4)
+
+    def test_postings_read_with_invalid_token_is_anonymous(self):
+        client = Client()
+        for token in ['garbage', jwt.encode({'id': 99}, SECRET_KEY, ALGORITHM)]:
+            response = client.get('/postings', HTTP_Authorization=token)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([card['likedByMe'] for card in response.json()['result']], [False]*4)
+
+            response = client.get('/postings/1', HTTP_Authorization=token)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.json()['posting']['likedByMe'])
+
+            response = client.get('/postings/batch?ids=1,2', HTTP_Authorization=token)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([posting['likedByMe'] for posting in response.json()['postings']], [False, False])
+
+    def test_postings_facets(self):
+        client = Client()
+        client.get('/postings/facets')
+        feed_cache.clear()
+
+        with self.assertNumQueries(5):
+            response = client.get('/postings/facets?style=modern')
+        facets = {name: {row['type']: row['count'] for row in rows} for name, rows in response.json()['facets'].items()}
+
+        self.assertEqual(facets['housingType'], {'one_room': 2, 'apartment': 0})
+        self.assertEqual(facets['style'], {'modern': 2, 'classic': 2})
+        self.assertEqual(facets['backColor'], {'red': 0, 'blue': 0, 'black': 1, 'white': 1})
+        self.assertEqual(facets['itemColor'], {'red': 2, 'blue': 0, 'black': 0, 'white': 0})
+        self.assertEqual(facets['size'], {'10': 1, '20': 1})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/postings/facets?style=1').json(), response.json())
+
+        Posting.objects.filter(id=2).update(style_id=1)
+        feed_cache.invalidate()
+        self.assertEqual(client.get('/postings/facets?style=modern').json()['facets']['style'][0]['count'], 3)
+
+    def test_feed_cache_stats_command(self):
+        client = Client()
+        client.get('/postings')
+        client.get('/postings')
+        out = StringIO()
+        call_command('feed_cache_stats', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'hits 1 misses 1 hit ratio 50.00%')
+
+    @patch('postings.utils.boto3.client')
     def test_writing_success(self, mock_s3client):
+        get_s3_client.cache_clear()
         client        = Client()
         mock_img      = MagicMock(sepc=File)
         mock_img.name = 'img.jpg'
@@ -333,6 +670,136 @@ class PostingsViewTest(TestCase):
         self.assertEqual(response.status_code, 201)
         self.assertEqual(response.json(), {"messege":"SUCCESS"})
 
+    @patch('postings.utils.boto3.client')
+    def test_writing_reuses_s3_client(self, mock_s3client):
+        get_s3_client.cache_clear()
+        client       = Client()
+        access_token = jwt.encode({'id': 1}, SECRET_KEY, ALGORITHM)
+        info         = json.dumps({
+            'housing_type' : 'one_room',
+            'size'         : '10',
+            'style'        : 'modern',
+            'back_color'   : 'black',
+            'item_color'   : 'red',
+            'text'         : 'test'
+            })
+        for _ in range(2):
+            image    = SimpleUploadedFile('img.jpg', b'image', content_type='image/jpeg')
+            response = client.post('/postings', {'image': image, 'info': info}, HTTP_Authorization=access_token)
+            self.assertEqual(response.status_code, 201)
+
+        mock_s3client.assert_called_once()
+        upload_fileobj = mock_s3client.return_value.upload_fileobj
+        self.assertEqual(upload_fileobj.call_count, 2)
+        self.assertEqual(upload_fileobj.call_args.kwargs['ExtraArgs'], {'ContentType': 'image/jpeg'})
+        self.assertEqual(upload_fileobj.call_args.kwargs['Config'].max_request_concurrency, 4)
+        get_s3_client.cache_clear()
+
+class UploadURLViewTest(TestCase):
+    def setUp(self):
+        User.objects.create(id=1, email='asdf@naver.com', nickname='wecode', kakao_id='1')
+        HousingType.objects.create(id=1, type='one_room')
+        Style.objects.create(id=1, type='modern')
+        Size.objects.create(id=1, type='10')
+        Color.objects.create(id=1, type='red')
+        Color.objects.create(id=2, type='black')
+        get_s3_client.cache_clear()
+        self.access_token = jwt.encode({'id': 1}, SECRET_KEY, ALGORITHM)
+
+    def tearDown(self):
+        get_s3_client.cache_clear()
+
+    def post_info(self, image_key):
+        return Client().post('/postings', {
+            'info' : json.dumps({
+                'housing_type' : 'one_room',
+                'size'         : '10',
+                'style'        : 'modern',
+                'back_color'   : 'black',
+                'item_color'   : 'red',
+                'text'         : 'test',
+                'image_key'    : image_key
+                })}, HTTP_Authorization=self.access_token)
+
+    @patch('postings.utils.boto3.client')
+    def test_upload_url_success(self, mock_s3client):
+        mock_s3client.return_value.generate_presigned_post.return_value = {
+            'url'    : 'https://bucket.s3.amazonaws.com/',
+            'fields' : {'key': 'image_key'}
+        }
+        response = Client().post(
+            '/postings/upload-url',
+            {'content_type': 'image/jpeg'},
+            content_type       = 'application/json',
+            HTTP_Authorization = self.access_token
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['url'], 'https://bucket.s3.amazonaws.com/')
+        self.assertTrue(response.json()['image_key'].startswith('1/'))
+
+    def test_upload_url_invalid_content_type(self):
+        response = Client().post(
+            '/postings/upload-url',
+            {'content_type': 'text/html'},
+            content_type       = 'application/json',
+            HTTP_Authorization = self.access_token
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"messege":"INVALID_CONTENT_TYPE"})
+
+    @patch('postings.views.schedule_derivatives')
+    @patch('postings.utils.boto3.client')
+    def test_writing_with_image_key_success(self, mock_s3client, mock_schedule):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_info('1/image_key')
+        self.assertEqual(response.status_code, 201)
+        mock_schedule.assert_called_once_with(Posting.objects.get().id, '1/image_key')
+        mock_s3client.return_value.head_object.assert_called_once()
+        mock_s3client.return_value.upload_fileobj.assert_not_called()
+        self.assertEqual(Posting.objects.get().image, AWS_S3_CUSTOM_DOMAIN + '1/image_key')
+
+    @patch('postings.utils.boto3.client')
+    def test_writing_with_missing_image_key(self, mock_s3client):
+        mock_s3client.return_value.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        response = self.post_info('1/image_key')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"messege":"INVALID_IMAGE_KEY"})
+
+    @patch('postings.utils.boto3.client')
+    def test_writing_with_other_users_image_key(self, mock_s3client):
+        response = self.post_info('2/image_key')
+        self.assertEqual(response.status_code, 400)
+        mock_s3client.return_value.head_object.assert_not_called()
+
+class ImageDerivativeTest(TestCase):
+    def test_render_derivatives(self):
+        image = BytesIO()
+        Image.new('RGB', (4000, 3000), 'red').save(image, 'JPEG')
+        files = render_derivatives(image.getvalue())
+
+        self.assertEqual(sorted(files), ['detail.jpg', 'detail.webp', 'thumb.jpg', 'thumb.webp'])
+        self.assertEqual(Image.open(BytesIO(files['thumb.webp'][0])).size, (480, 360))
+        self.assertEqual(Image.open(BytesIO(files['detail.jpg'][0])).size, (1280, 960))
+        self.assertEqual(files['thumb.webp'][1], 'image/webp')
+
+    def test_derivative_url(self):
+        posting = Posting(image='https://cdn/key')
+        self.assertEqual(derivative_url(posting, 'thumb'), 'https://cdn/key')
+
+        posting.has_derivatives = True
+        self.assertEqual(derivative_url(posting, 'thumb', 'webp'), 'https://cdn/key_thumb.webp')
+
+    @patch('postings.images.get_pool')
+    def test_schedule_derivatives_logs_failure(self, mock_pool):
+        future = Future()
+        future.set_exception(OSError('broken image'))
+        mock_pool.return_value.submit.return_value = future
+
+        with self.assertLogs('postings.images', 'ERROR') as logs:
+            schedule_derivatives(7, 'postings/key')
+        self.assertIn('posting 7 (postings/key)', logs.output[0])
+        self.assertIn('broken image', logs.output[0])
+
 class PostingTestCase(TestCase): 
     def setUp(self):
         posting_user = User.objects.create(
@@ -348,17 +815,19 @@ class PostingTestCase(TestCase):
         housing_type_one_room = HousingType.objects.create(id=1, type='one_room')
         color = Color.objects.create(id=1,type='red')
         posting_1 = Posting.objects.create(
-            id        = 1,
-            item_color = color,
-            back_color = color,
-            user      = posting_user,
-            size      = size_30,
-            style     = style_modern,
-            housing_type   = housing_type_one_room,
-            image     = 'posting_image_url',
-            text      = '굿굿',
-            update_at = '2021-06-28',
-            view      = 150
+            id            = 1,
+            item_color    = color,
+            back_color    = color,
+            user          = posting_user,
+            size          = size_30,
+            style         = style_modern,
+            housing_type  = housing_type_one_room,
+            image         = 'posting_image_url',
+            text          = '굿굿',
+            update_at     = '2021-06-28',
+            view          = 150,
+            like_count    = 1,
+            comment_count = 1
         )
         posting_comment_user = User.objects.create(
             id            = 2,
@@ -379,6 +848,8 @@ class PostingTestCase(TestCase):
         Posting.objects.all().delete()
         Comment.objects.all().delete()
         Like.objects.all().delete()
+        view_counter.pending.clear()
+
     def test_postingview_get_success(self):  
         client   = Client()  
         response = client.get('/postings/1')
@@ -388,6 +859,7 @@ class PostingTestCase(TestCase):
                 {
                 'id'          : 1,
                 'image'       : "posting_image_url",
+                'image_webp'  : "posting_image_url",
                 'text'        : "굿굿",
                 'size'        : '30',
                 'style'       : 'modern',
@@ -399,6 +871,171 @@ class PostingTestCase(TestCase):
                     'nickname'     : '하이',
                     'image_url'    : 'profile_image_url',
                     'introduction' : '안녕하세요'
-                    }]
+                    }],
+                'likedByMe'   : False
                 }
-        })
\ No newline at end of file
+        })
+
+    def test_postingview_liked_by_me(self):
+        client       = Client()
+        access_token = jwt.encode({'id': 2}, SECRET_KEY, ALGORITHM)
+        response     = client.get('/postings/1', HTTP_Authorization=access_token)
+        self.assertTrue(response.json()['posting']['likedByMe'])
+        self.assertIn('Authorization', response['Vary'])
+        self.assertNotEqual(response['ETag'], client.get('/postings/1')['ETag'])
+
+    def test_like_status(self):
+        client       = Client()
+        access_token = jwt.encode({'id': 2}, SECRET_KEY, ALGORITHM)
+        with self.assertNumQueries(2):
+            response = client.get('/postings/like-status?ids=1,2,1', HTTP_Authorization=access_token)
+        self.assertEqual(response.json(), {'result': [{'id': 1, 'likedByMe': True}, {'id': 2, 'likedByMe': False}]})
+        self.assertEqual(client.get('/postings/like-status?ids=1').status_code, 401)
+        self.assertEqual(client.get('/postings/like-status?ids=x', HTTP_Authorization=access_token).json(), {'message': 'INVALID_IDS'})
+
+    @patch.object(view_counter, 'flush_interval', float('inf'))
+    def test_postingview_not_modified(self):
+        client   = Client()
+        response = client.get('/postings/1')
+        etag     = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = client.get('/postings/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Posting.objects.filter(id=1).update(like_count=F('like_count')+1)
+        response = client.get('/postings/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @patch.object(view_counter, 'flush_interval', float('inf'))
+    def test_postingview_not_modified_counts_view(self):
+        client = Client()
+        etag   = client.get('/postings/1')['ETag']
+
+        self.assertEqual(client.get('/postings/1', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(view_counter.buffered(1), 2)
+
+        view_counter.flush()
+        self.assertEqual(Posting.objects.get(id=1).view, 152)
+        self.assertNotEqual(client.get('/postings/1')['ETag'], etag)
+
+    def test_postingview_not_found_has_no_etag(self):
+        response = Client().get('/postings/100')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+    @patch.object(view_counter, 'flush_interval', float('inf'))
+    def test_postingview_views_are_buffered(self):
+        client = Client()
+        client.get('/postings/1')
+        response = client.get('/postings/1')
+        self.assertEqual(response.json()['posting']['view'], 152)
+        self.assertEqual(Posting.objects.get(id=1).view, 150)
+
+        with self.assertNumQueries(1):
+            view_counter.flush()
+        self.assertEqual(Posting.objects.get(id=1).view, 152)
+        self.assertEqual(view_counter.buffered(1), 0)
+
+    @patch.object(view_counter, 'flush_interval', float('inf'))
+    def test_postingview_get_uses_lookup_tables(self):
+        client = Client()
+        client.get('/postings/1')
+        with self.assertNumQueries(2):
+            client.get('/postings/1')
+
+    def test_lookup_table_cleared_on_save(self):
+        self.assertEqual(lookup_tables[Style].get(id=1).type, 'modern')
+        style      = Style.objects.get(id=1)
+        style.type = 'classic'
+        style.save()
+        self.assertEqual(lookup_tables[Style].get(type='classic').id, 1)
+        with self.assertRaises(Style.DoesNotExist):
+            lookup_tables[Style].get(type='modern')
+
+    @patch.object(view_counter, 'flush_interval', float('inf'))
+    def test_posting_batch_get(self):
+        posting_2 = Posting.objects.get(id=1)
+        posting_2.id, posting_2.text = 2, '두번째'
+        posting_2.save()
+
+        client = Client()
+        detail = client.get('/postings/1').json()['posting']
+        with self.assertNumQueries(1):
+            response = client.get('/postings/batch?ids=2,999,1,2')
+
+        self.assertEqual(response.status_code, 200)
+        postings = response.json()['postings']
+        self.assertEqual([posting['id'] for posting in postings], [2, 1])
+        self.assertEqual(postings[1], {**detail, 'view': 152})
+        self.assertEqual(view_counter.buffered(1), 2)
+        self.assertEqual(view_counter.buffered(2), 1)
+
+    def test_posting_batch_invalid_ids(self):
+        client = Client()
+        self.assertEqual(client.get('/postings/batch').json(), {'message': 'KEY_ERROR'})
+        self.assertEqual(client.get('/postings/batch?ids=1,a').json(), {'message': 'INVALID_IDS'})
+        with self.settings(POSTING_BATCH_LIMIT=2):
+            response = client.get('/postings/batch?ids=1,2,3')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'TOO_MANY_IDS'})
+
+    def test_view_counter_flushes_when_full(self):
+        counter = ViewCounter(buffer_size=3, flush_interval=60)
+        counter.add(1)
+        counter.add(1)
+        self.assertEqual(Posting.objects.get(id=1).view, 150)
+        counter.add(1)
+        self.assertEqual(Posting.objects.get(id=1).view, 153)
+
+    def test_view_counter_flush_error_keeps_request_alive(self):
+        counter = ViewCounter(buffer_size=1, flush_interval=60)
+        with patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError), self.assertLogs('postings.utils', 'ERROR'):
+            self.assertEqual(counter.add(1), 1)
+        self.assertEqual(counter.buffered(1), 1)
+
+        with patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            counter.flush()
+        counter.flush()
+        self.assertEqual(Posting.objects.get(id=1).view, 151)
+
+    def test_like_updates_like_count(self):
+        client       = Client()
+        access_token = jwt.encode({'id': 1}, SECRET_KEY, ALGORITHM)
+        response     = client.post('/postings/like/1', HTTP_Authorization=access_token)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Posting.objects.get(id=1).like_count, 2)
+
+        response = client.delete('/postings/like/1', HTTP_Authorization=access_token)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(Posting.objects.get(id=1).like_count, 1)
+
+    def test_like_is_idempotent(self):
+        client       = Client()
+        access_token = jwt.encode({'id': 2}, SECRET_KEY, ALGORITHM)
+
+        response = client.post('/postings/like/1', HTTP_Authorization=access_token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'message': 'ALREADY_LIKED'})
+        self.assertEqual(Like.objects.filter(user_id=2, posting_id=1).count(), 1)
+        self.assertEqual(Posting.objects.get(id=1).like_count, 1)
+
+        self.assertEqual(client.delete('/postings/like/1', HTTP_Authorization=access_token).status_code, 204)
+        response = client.delete('/postings/like/1', HTTP_Authorization=access_token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'message': 'NOT_LIKED'})
+        self.assertEqual(Posting.objects.get(id=1).like_count, 0)
+
+    def test_like_missing_posting(self):
+        access_token = jwt.encode({'id': 2}, SECRET_KEY, ALGORITHM)
+        response     = Client().post('/postings/like/100', HTTP_Authorization=access_token)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Like.objects.filter(posting_id=100).exists())
+
+    def test_rebuild_posting_counts(self):
+        Posting.objects.update(like_count=7, comment_count=7)
+        call_command('rebuild_posting_counts', stdout=StringIO())
+        posting = Posting.objects.get(id=1)
+        self.assertEqual(posting.like_count, 1)
+        self.assertEqual(posting.comment_count, 1)
@@ -1,9 +1,13 @@
 from django.urls import path
 
-from postings.views import PostingsView, PostingView, LikeView
+from postings.views import PostingsView, FacetsView, PostingView, PostingBatchView, LikeView, LikeStatusView, UploadURLView
 
 urlpatterns = [
     path('', PostingsView.as_view()),
+    path('/upload-url', UploadURLView.as_view()),
+    path('/batch', PostingBatchView.as_view()),
+    path('/facets', FacetsView.as_view()),
     path('/<int:posting_id>', PostingView.as_view()),
-    path('/like/<int:posting_id>', LikeView.as_view())
+    path('/like/<int:posting_id>', LikeView.as_view()),
+    path('/like-status', LikeStatusView.as_view())
 ]
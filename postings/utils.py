@@ -0,0 +1,354 @@
+import re, json, base64, binascii, hashlib, threading, time, atexit, functools, logging, boto3
+from collections import defaultdict, Counter
+
+from boto3.s3.transfer   import TransferConfig
+from botocore.config     import Config
+from botocore.exceptions import ClientError
+
+from django.conf                  import settings
+from django.core.cache            import caches
+from django.db                    import DatabaseError
+from django.db.models             import Q, F, Sum, OuterRef, Subquery
+from django.db.models.functions   import Greatest, Log
+from django.db.models.signals     import post_save, post_delete
+
+from .models             import Posting, PostingTerm, Like, HousingType, Size, Style, Color
+from .scoring            import popularity, posting_score
+from comments.models     import Comment
+from yourhousetoday.http import chunked
+from my_settings         import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_STORAGE_BUCKET_NAME
+
+logger = logging.getLogger(__name__)
+
+def encode_cursor(sort, value, id):
+    payload = json.dumps({'sort': sort, 'value': value, 'id': id}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor, sort):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if payload['sort'] != sort:
+            raise ValueError('cursor was issued for another sort')
+        return payload['value'], int(payload['id'])
+    except (binascii.Error, UnicodeDecodeError, TypeError, KeyError) as error:
+        raise ValueError('invalid cursor') from error
+
+def keyset_order(sort):
+    return (sort, '-id' if sort.startswith('-') else 'id')
+
+def keyset_filter(sort, value, id):
+    field  = sort.lstrip('-')
+    lookup = 'lt' if sort.startswith('-') else 'gt'
+    return Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': id})
+
+# MySQL evaluates SET assignments left to right, so pass this before the counter columns in update().
+def score_change(views=0, likes=0, comments=0):
+    before = popularity(F('view'), F('like_count'), F('comment_count'))
+    after  = popularity(F('view')+views, F('like_count')+likes, F('comment_count')+comments)
+    return F('score') + Log(2, Greatest(after, 1)) - Log(2, Greatest(before, 1))
+
+def rebuild_scores(batch_size):
+    last_id = 0
+    updated = 0
+
+    while True:
+        postings = list(
+            Posting.objects
+            .filter(id__gt=last_id)
+            .only('id', 'view', 'like_count', 'comment_count', 'create_at', 'score')
+            .order_by('id')[:batch_size]
+        )
+        if not postings:
+            return updated
+
+        for posting in postings:
+            posting.score = posting_score(popularity(posting.view, posting.like_count, posting.comment_count), posting.create_at)
+
+        Posting.objects.bulk_update(postings, ['score'])
+        updated += len(postings)
+        last_id  = postings[-1].id
+
+def comment_preview(comment):
+    return {
+        'preview_comment'       : comment,
+        'preview_text'          : comment.text,
+        'preview_nickname'      : comment.user.nickname,
+        'preview_profile_image' : comment.user.profile_image
+    }
+
+def latest_comment_preview():
+    latest = Comment.objects.filter(posting=OuterRef('pk'), thread__isnull=True).order_by('-create_at', '-id')
+    return {
+        'preview_comment'       : Subquery(latest.values('id')[:1]),
+        'preview_text'          : Subquery(latest.values('text')[:1]),
+        'preview_nickname'      : Subquery(latest.values('user__nickname')[:1]),
+        'preview_profile_image' : Subquery(latest.values('user__profile_image')[:1])
+    }
+
+class ViewCounter:
+    def __init__(self, buffer_size, flush_interval):
+        self.buffer_size    = buffer_size
+        self.flush_interval = flush_interval
+        self.pending        = defaultdict(int)
+        self.last_flush     = time.monotonic()
+        self.lock           = threading.Lock()
+
+    def add(self, posting_id, count=1):
+        return self.add_many([posting_id], count)[posting_id]
+
+    def add_many(self, posting_ids, count=1):
+        with self.lock:
+            for posting_id in posting_ids:
+                self.pending[posting_id] += count
+            buffered   = {posting_id: self.pending[posting_id] for posting_id in posting_ids}
+            need_flush = (
+                sum(self.pending.values()) >= self.buffer_size
+                or time.monotonic() - self.last_flush >= self.flush_interval
+            )
+
+        if need_flush:
+            try:
+                self.flush()
+            except DatabaseError:
+                logger.exception('view count flush failed, counts re-queued')
+        return buffered
+
+    def buffered(self, posting_id):
+        with self.lock:
+            return self.pending.get(posting_id, 0)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(int)
+            self.last_flush       = time.monotonic()
+
+        increments = defaultdict(list)
+        for posting_id, count in pending.items():
+            increments[count].append(posting_id)
+
+        remaining = dict(increments)
+        try:
+            for count, posting_ids in increments.items():
+                Posting.objects.filter(id__in=posting_ids).update(
+                    score = score_change(views=count),
+                    view  = F('view')+count
+                )
+                del remaining[count]
+        except DatabaseError:
+            with self.lock:
+                for count, posting_ids in remaining.items():
+                    for posting_id in posting_ids:
+                        self.pending[posting_id] += count
+            raise
+
+view_counter = ViewCounter(
+    buffer_size    = getattr(settings, 'VIEW_COUNT_BUFFER_SIZE', 100),
+    flush_interval = getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10)
+)
+atexit.register(view_counter.flush)
+
+class LookupTable:
+    def __init__(self, model, timeout):
+        self.model     = model
+        self.timeout   = timeout
+        self.rows      = None
+        self.loaded_at = 0
+
+    def load(self):
+        if self.rows is None or time.monotonic() - self.loaded_at >= self.timeout:
+            rows           = list(self.model.objects.all())
+            self.rows      = ({row.id: row for row in rows}, {row.type: row for row in rows})
+            self.loaded_at = time.monotonic()
+        return self.rows
+
+    def get(self, id=None, type=None):
+        by_id, by_type = self.load()
+        row            = by_id.get(id) if type is None else by_type.get(type)
+
+        if row is None:
+            raise self.model.DoesNotExist(f'{self.model.__name__} matching id={id}, type={type} does not exist')
+        return row
+
+    def resolve(self, value):
+        try:
+            return self.get(id=int(value)).id if value.isdigit() else self.get(type=value).id
+        except self.model.DoesNotExist:
+            return None
+
+    def clear(self, **kwargs):
+        self.rows = None
+
+lookup_tables = {
+    model: LookupTable(model, getattr(settings, 'LOOKUP_TABLE_TIMEOUT', 300))
+    for model in (HousingType, Size, Style, Color)
+}
+
+for model, table in lookup_tables.items():
+    post_save.connect(table.clear, sender=model, weak=False)
+    post_delete.connect(table.clear, sender=model, weak=False)
+
+def tokenize(text):
+    terms = Counter()
+    for word in re.findall(r'\w+', text.lower()):
+        terms[word[:50]] += 1
+        if not word.isascii() and len(word) > 2:
+            terms.update(word[index:index+2] for index in range(len(word)-1))
+    return terms
+
+def build_terms(postings):
+    return [
+        PostingTerm(posting_id=posting.id, term=term, count=count)
+        for posting in postings for term, count in tokenize(posting.text).items()
+    ]
+
+def index_posting(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields is not None and 'text' not in update_fields:
+        return
+
+    if not created:
+        PostingTerm.objects.filter(posting_id=instance.id).delete()
+    PostingTerm.objects.bulk_create(build_terms([instance]))
+
+post_save.connect(index_posting, sender=Posting)
+
+def search_relevance(query):
+    terms   = list(tokenize(query))
+    matches = PostingTerm.objects.filter(term__in=terms)
+    score   = matches.filter(posting=OuterRef('pk')).values('posting').annotate(relevance=Sum('count')).values('relevance')
+    return Q(id__in=matches.values('posting_id')), Subquery(score)
+
+class FeedCache:
+    def __init__(self, alias, timeout):
+        self.alias   = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version(self):
+        self.cache.add('feed:version', time.time_ns(), None)
+        return self.cache.get('feed:version')
+
+    def key(self, params):
+        digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f'feed:{self.version()}:{digest}'
+
+    def count(self, name):
+        self.cache.add(f'feed:{name}', 0, None)
+        self.cache.incr(f'feed:{name}')
+
+    def get(self, params):
+        content = self.cache.get(self.key(params))
+        self.count('misses' if content is None else 'hits')
+        return content
+
+    def set(self, params, content):
+        self.cache.set(self.key(params), content, self.timeout)
+
+    def invalidate(self):
+        try:
+            self.cache.incr('feed:version')
+        except ValueError:
+            self.cache.add('feed:version', time.time_ns(), None)
+
+    def counts_changed(self):
+        if self.cache.add('feed:counts-changed', 1, self.timeout):
+            self.invalidate()
+
+    def stats(self):
+        return {
+            'hits'   : self.cache.get('feed:hits', 0),
+            'misses' : self.cache.get('feed:misses', 0)
+        }
+
+    def clear(self):
+        self.cache.delete_many(['feed:hits', 'feed:misses', 'feed:counts-changed'])
+        self.invalidate()
+
+feed_cache = FeedCache(
+    alias   = getattr(settings, 'FEED_CACHE_ALIAS', 'default'),
+    timeout = getattr(settings, 'FEED_CACHE_TIMEOUT', 30)
+)
+
+def mark_liked(cards, user=None):
+    liked = set()
+    if user is not None and cards:
+        liked = set(
+            Like.objects
+            .filter(user_id=user.id, posting_id__in=[card['id'] for card in cards])
+            .values_list('posting_id', flat=True)
+        )
+
+    for card in cards:
+        card['likedByMe'] = card['id'] in liked
+    return cards
+
+class StreamedPage:
+    def __init__(self, queryset, sort, limit):
+        self.queryset = queryset
+        self.sort     = sort
+        self.limit    = limit
+        self.count    = 0
+        self.last     = None
+
+    def items(self, render):
+        rows = self.queryset.iterator(chunk_size=settings.STREAM_CHUNK_SIZE)
+        for chunk in chunked(rows, settings.STREAM_CHUNK_SIZE):
+            self.count += len(chunk)
+            self.last   = chunk[-1]
+            yield from render(chunk)
+
+    def next_cursor(self):
+        return page_cursor(self.sort, self.limit, self.count, self.last)
+
+def page_cursor(sort, limit, count, last):
+    if count != limit or last is None:
+        return None
+    return encode_cursor(sort, getattr(last, sort.lstrip('-')), last.id)
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    return boto3.client(
+        's3',
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        config=Config(max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS)
+    )
+
+def upload_image(image, key):
+    get_s3_client().upload_fileobj(
+        image,
+        AWS_STORAGE_BUCKET_NAME,
+        key,
+        ExtraArgs={
+            "ContentType": image.content_type
+        },
+        Config=TransferConfig(
+            multipart_threshold = settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize = settings.S3_MULTIPART_CHUNKSIZE,
+            max_concurrency     = settings.S3_MAX_CONCURRENCY
+        ))
+
+def presign_upload(key, content_type):
+    return get_s3_client().generate_presigned_post(
+        AWS_STORAGE_BUCKET_NAME,
+        key,
+        Fields={
+            "Content-Type": content_type
+        },
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, settings.S3_UPLOAD_MAX_SIZE]
+        ],
+        ExpiresIn=settings.S3_PRESIGNED_EXPIRES
+    )
+
+def image_exists(key):
+    try:
+        get_s3_client().head_object(Bucket=AWS_STORAGE_BUCKET_NAME, Key=key)
+        return True
+    except ClientError as error:
+        if error.response['Error']['Code'] in ('404', '403', 'NoSuchKey'):
+            return False
+        raise
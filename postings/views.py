@@ -1,97 +1,219 @@
-import math, json, datetime, boto3, uuid
+import math, json, datetime, uuid
 
-from django.views     import View
-from django.db.models import Q
-from django.http      import JsonResponse
+from django.conf                 import settings
+from django.core.exceptions      import ValidationError
+from django.views                import View
+from django.db                   import transaction, IntegrityError
+from django.db.models            import Q, F, Count
+from django.http                 import JsonResponse, HttpResponse
+from django.utils.cache          import patch_vary_headers
+from django.utils.decorators     import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 
-from .models      import Posting, Like, HousingType, Size, Style, Color
-from users.utils  import authorize_user
-from my_settings  import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_S3_CUSTOM_DOMAIN, AWS_STORAGE_BUCKET_NAME
+from .models             import Posting, Like, HousingType, Size, Style, Color
+from .images             import schedule_derivatives, derivative_url
+from .utils              import decode_cursor, keyset_filter, keyset_order, page_cursor, view_counter, lookup_tables, upload_image, presign_upload, image_exists, feed_cache, StreamedPage, mark_liked, score_change, tokenize, search_relevance
+from users.utils         import authorize_user, optional_user
+from yourhousetoday.http import make_etag, conditional_response, stream_requested, StreamingJsonResponse
+from my_settings         import AWS_S3_CUSTOM_DOMAIN
+
+SORTS = {
+    'create_at'  : 'create_at',
+    '-create_at' : '-create_at',
+    'view'       : 'view',
+    '-view'      : '-view',
+    'popular'    : '-score'
+}
+
+FACETS = (
+    ('housingType', 'housing_type_id', HousingType, 'housing_type_id'),
+    ('style',       'style_id',        Style,       'style_id'),
+    ('backColor',   'back_color_id',   Color,       'back_color_id'),
+    ('itemColor',   'item_color_id',   Color,       'item_color_id'),
+    ('size',        'size_id',         Size,        'size__id__range'),
+)
+
+def posting_etag(request, posting_id):
+    user      = getattr(request, 'user', None)
+    validator = Posting.objects.filter(id=posting_id).values_list(
+        'update_at', 'view', 'like_count', 'comment_count', 'has_derivatives',
+        'user__nickname', 'user__profile_image', 'user__introduction'
+    ).first()
+    return make_etag(posting_id, user and user.id, *validator) if validator else None
+
+def count_not_modified(func):
+    def wrapper(self, request, posting_id, **kwarg):
+        response = func(self, request, posting_id=posting_id, **kwarg)
+        if response.status_code == 304:
+            view_counter.add(posting_id)
+        return response
+    return wrapper
+
+def posting_cards(postings):
+    return [
+        {
+            'id'             : posting.id,
+            'profileImage'   : posting.user.profile_image,
+            'profileName'    : posting.user.nickname,
+            'introduce'      : posting.user.introduction,
+            'title'          : posting.text,
+            'cardImage'      : derivative_url(posting, 'thumb'),
+            'cardImageWebp'  : derivative_url(posting, 'thumb', 'webp'),
+            'viewCount'      : posting.view,
+            'heartCount'     : posting.like_count,
+            'commentCount'   : posting.comment_count,
+            'writerImage'    : [posting.preview_profile_image] if posting.preview_comment_id else '',
+            'writerName'     : [posting.preview_nickname] if posting.preview_comment_id else '',
+            'commentContent' : [posting.preview_text] if posting.preview_comment_id else ''
+        }
+        for posting in postings]
+
+def posting_ids_param(request):
+    return list(dict.fromkeys(int(posting_id) for posting_id in request.GET['ids'].split(',')))
+
+def posting_detail(posting, views):
+    return {
+        'id'           : posting.id,
+        'image'        : derivative_url(posting, 'detail'),
+        'image_webp'   : derivative_url(posting, 'detail', 'webp'),
+        'text'         : posting.text,
+        'size'         : lookup_tables[Size].get(id=posting.size_id).type,
+        'style'        : lookup_tables[Style].get(id=posting.style_id).type,
+        'like'         : posting.like_count,
+        'housing_type' : lookup_tables[HousingType].get(id=posting.housing_type_id).type,
+        'view'         : views,
+        'related_user' : [{  
+            'id'           : posting.user.id,
+            'nickname'     : posting.user.nickname,
+            'image_url'    : posting.user.profile_image,
+            'introduction' : posting.user.introduction   
+        }]
+    }
+
+def feed_filters(request):
+    housing_type = request.GET.get('housing-type', None)
+    back_color   = request.GET.get('back-color', None)
+    item_color   = request.GET.get('item-color', None)
+    min_size     = int(request.GET.get('min-size', 1))
+    max_size     = int(request.GET.get('max-size', 71))
+    style        = request.GET.get('style', None)
+    filters      = {}
+
+    if not max_size%10:
+        max_size -= 1
+
+    min_size = math.ceil(min_size/10)
+    max_size = math.ceil(max_size/10)
+
+    if housing_type:
+        filters['housing_type_id'] = lookup_tables[HousingType].resolve(housing_type)
+
+    if back_color:
+        filters['back_color_id'] = lookup_tables[Color].resolve(back_color)
+
+    if item_color:
+        filters['item_color_id'] = lookup_tables[Color].resolve(item_color)
+    
+    if style:
+        filters['style_id'] = lookup_tables[Style].resolve(style)
+    
+    if 'min-size' in request.GET or 'max-size' in request.GET:
+        filters['size__id__range'] = (min_size,max_size)
+
+    return filters
 
 class PostingsView(View):
+    @optional_user
     def get(self, request):
-        housing_type  = request.GET.get('housing-type', None)
-        back_color    = request.GET.get('back-color', None)
-        item_color    = request.GET.get('item-color', None)
-        min_size      = int(request.GET.get('min-size', 1))
-        max_size      = int(request.GET.get('max-size', 71))
-        style         = request.GET.get('style', None)
-        sort          = request.GET.get('sort', 'create_at')
-        limit         = int(request.GET.get('limit', 8))
-        offset        = int(request.GET.get('offset',1))
-        postings_list = []
+        search = request.GET.get('search', None)
+        sort   = request.GET.get('sort', 'relevance' if search else 'create_at')
+        limit  = int(request.GET.get('limit', 8))
+        offset = int(request.GET.get('offset',1))
+        cursor = request.GET.get('cursor', None)
 
         offset = limit*(offset-1)
 
-        if not max_size%10:
-            max_size -= 1
+        if search and sort == 'relevance':
+            order = '-relevance'
+        elif sort in SORTS:
+            order = SORTS[sort]
+        else:
+            return JsonResponse({'message':'INVALID_SORT'}, status = 400)
 
-        min_size = math.ceil(min_size/10)
-        max_size = math.ceil(max_size/10)
+        filters = feed_filters(request)
+        q = Q(**filters)
 
-        q = Q()
+        if search:
+            matched, relevance = search_relevance(search)
+            q &= matched
 
-        if housing_type:
-            q &= Q(housing_type_id=housing_type)
+        postings = (
+            Posting.objects
+            .select_related('user')
+            .annotate(**({'relevance': relevance} if search else {}))
+            .filter(q)
+        )
 
-        if back_color:
-            q &= Q(back_color_id=back_color)
+        if cursor:
+            try:
+                postings = postings.filter(keyset_filter(order, *decode_cursor(cursor, order)))
+                offset   = 0
+            except (ValueError, TypeError, ValidationError):
+                return JsonResponse({'message':'INVALID_CURSOR'}, status = 400)
 
-        if item_color:
-            q &= Q(item_color_id=item_color)
-        
-        if style:
-            q &= Q(style_id=style)
-        
-        q &= Q(size__id__range=(min_size,max_size))
-        
-        postings = Posting.objects.filter(q).order_by(sort)[offset:offset+limit]
-        
-        postings_list = [
-            {
-                'id'             : posting.id,
-                'profileImage'   : posting.user.profile_image,
-                'profileName'    : posting.user.nickname,
-                'introduce'      : posting.user.introduction,
-                'title'          : posting.text,
-                'cardImage'      : posting.image,
-                'viewCount'      : posting.view,
-                'heartCount'     : posting.like_posting.count(),
-                'commentCount'   : posting.comment_set.order_by('create_at').count(),
-                'writerImage'    : [posting.comment_set.order_by('create_at')[0].user.profile_image] if posting.comment_set.count() != 0 else '',
-                'writerName'     : [posting.comment_set.order_by('create_at')[0].user.nickname] if posting.comment_set.count() != 0 else '',
-                'commentContent' : [posting.comment_set.order_by('create_at')[0].text] if posting.comment_set.count() != 0 else ''
-            }
-            for posting in postings]
-        return JsonResponse({'result':postings_list}, status = 200)
+        user     = getattr(request, 'user', None)
+        postings = postings.order_by(*keyset_order(order))[offset:offset+limit]
+
+        if stream_requested(request, limit):
+            page = StreamedPage(postings, order, limit)
+            return StreamingJsonResponse({
+                'result'      : page.items(lambda chunk: mark_liked(posting_cards(chunk), user)),
+                'next_cursor' : page.next_cursor
+            }, status = 200)
+
+        cache_params = {**filters, 'search': sorted(tokenize(search or '')), 'sort': sort, 'limit': limit, 'offset': offset, 'cursor': cursor}
+        content      = feed_cache.get(cache_params)
+
+        if content is None:
+            postings      = list(postings)
+            postings_list = mark_liked(posting_cards(postings))
+            next_cursor   = page_cursor(order, limit, len(postings), postings[-1] if postings else None)
+
+            content = JsonResponse({'result':postings_list, 'next_cursor':next_cursor}).content
+            feed_cache.set(cache_params, content)
+
+        if user is not None:
+            page    = json.loads(content)
+            content = JsonResponse({**page, 'result':mark_liked(page['result'], user)}).content
+
+        response = HttpResponse(content, content_type='application/json', status = 200)
+        patch_vary_headers(response, ('Authorization',))
+        return conditional_response(request, response)
 
     @authorize_user
     def post(self, request):
         try:
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-            )
-            image = request.FILES['image']
-            my_uuid = str(uuid.uuid4())
-            s3_client.upload_fileobj(
-                image, 
-                AWS_STORAGE_BUCKET_NAME,
-                my_uuid,
-                ExtraArgs={
-                    "ContentType": image.content_type
-                })
-            image_url    = AWS_S3_CUSTOM_DOMAIN + my_uuid
-            data         = json.loads(request.POST['info'])
-            housing_type = HousingType.objects.get(type=data['housing_type'])
-            size         = Size.objects.get(type=data['size'])
-            style        = Style.objects.get(type=data['style'])
-            back_color   = Color.objects.get(type=data['back_color'])
-            item_color   = Color.objects.get(type=data['item_color'])
+            data = json.loads(request.POST['info'])
+
+            if 'image' in request.FILES:
+                image_key = str(uuid.uuid4())
+                upload_image(request.FILES['image'], image_key)
+            else:
+                image_key = data['image_key']
+
+                if not image_key.startswith(f'{request.user.id}/') or not image_exists(image_key):
+                    return JsonResponse({"messege":"INVALID_IMAGE_KEY"}, status = 400)
+
+            image_url    = AWS_S3_CUSTOM_DOMAIN + image_key
+            housing_type = lookup_tables[HousingType].get(type=data['housing_type'])
+            size         = lookup_tables[Size].get(type=data['size'])
+            style        = lookup_tables[Style].get(type=data['style'])
+            back_color   = lookup_tables[Color].get(type=data['back_color'])
+            item_color   = lookup_tables[Color].get(type=data['item_color'])
             text         = data['text']
 
-            Posting.objects.create(
+            posting = Posting.objects.create(
                 user         = request.user,
                 housing_type = housing_type,
                 size         = size,
@@ -102,47 +224,126 @@ class PostingsView(View):
                 text         = text,
                 update_at    = datetime.datetime.now()
                 )
+            transaction.on_commit(lambda: schedule_derivatives(posting.id, image_key))
+            transaction.on_commit(feed_cache.invalidate)
             return JsonResponse({"messege":"SUCCESS"}, status = 201)
 
         except KeyError:
             return JsonResponse({"messege":"KEY_ERROR"}, status = 400)
 
+class FacetsView(View):
+    def get(self, request):
+        search       = request.GET.get('search', None)
+        filters      = feed_filters(request)
+        cache_params = {**filters, 'search': sorted(tokenize(search or '')), 'facets': True}
+        content      = feed_cache.get(cache_params)
+
+        if content is None:
+            matched = search_relevance(search)[0] if search else Q()
+            facets  = {}
+
+            for name, field, model, lookup in FACETS:
+                others = Q(**{key: value for key, value in filters.items() if key != lookup})
+                counts = dict(
+                    Posting.objects
+                    .filter(others & matched)
+                    .values_list(field)
+                    .annotate(count=Count('id'))
+                    .order_by()
+                )
+                facets[name] = [
+                    {'id': row.id, 'type': row.type, 'count': counts.get(row.id, 0)}
+                    for row in lookup_tables[model].load()[0].values()
+                ]
+
+            content = JsonResponse({'facets': facets}).content
+            feed_cache.set(cache_params, content)
+
+        return conditional_response(request, HttpResponse(content, content_type='application/json', status = 200))
+
+class UploadURLView(View):
+    @authorize_user
+    def post(self, request):
+        try:
+            content_type = json.loads(request.body)['content_type']
+
+            if not content_type.startswith('image/'):
+                return JsonResponse({"messege":"INVALID_CONTENT_TYPE"}, status = 400)
+
+            image_key = f'{request.user.id}/{uuid.uuid4()}'
+            presigned = presign_upload(image_key, content_type)
+
+            return JsonResponse({
+                'url'       : presigned['url'],
+                'fields'    : presigned['fields'],
+                'image_key' : image_key
+            }, status = 201)
+
+        except KeyError:
+            return JsonResponse({"messege":"KEY_ERROR"}, status = 400)
+
+        except json.JSONDecodeError:
+            return JsonResponse({"messege":"JSON_DECODE_ERROR"}, status = 400)
+
 class PostingView(View):
+    @optional_user
+    @count_not_modified
+    @method_decorator(vary_on_headers('Authorization'))
+    @method_decorator(condition(etag_func=posting_etag))
     def get(self, request, posting_id):
         try:
-            posting = Posting.objects.get(id=posting_id)
-            posting.view += 1
-            posting.save()
-            result = {
-                'id'           : posting.id,
-                'image'        : posting.image,
-                'text'         : posting.text,
-                'size'         : posting.size.type,
-                'style'        : posting.style.type,
-                'like'         : posting.like_posting.count(),
-                'housing_type' : posting.housing_type.type,
-                'view'         : posting.view,
-                'related_user' : [{  
-                    'id'           : posting.user.id,
-                    'nickname'     : posting.user.nickname,
-                    'image_url'    : posting.user.profile_image,
-                    'introduction' : posting.user.introduction   
-                }]
-            }
+            posting = Posting.objects.select_related('user').get(id=posting_id)
+            result  = posting_detail(posting, posting.view + view_counter.add(posting.id))
+            mark_liked([result], getattr(request, 'user', None))
             
             return JsonResponse({'posting' : result}, status=200)
         except Posting.DoesNotExist:
             return JsonResponse({'message': 'object does not exist'}, status=404)
+
+class PostingBatchView(View):
+    @optional_user
+    def get(self, request):
+        try:
+            posting_ids = posting_ids_param(request)
+        except KeyError:
+            return JsonResponse({'message': 'KEY_ERROR'}, status=400)
+        except ValueError:
+            return JsonResponse({'message': 'INVALID_IDS'}, status=400)
+
+        if len(posting_ids) > settings.POSTING_BATCH_LIMIT:
+            return JsonResponse({'message': 'TOO_MANY_IDS'}, status=400)
+
+        postings = Posting.objects.select_related('user').in_bulk(posting_ids)
+        views    = view_counter.add_many(list(postings))
+        result   = mark_liked([
+            posting_detail(postings[posting_id], postings[posting_id].view + views[posting_id])
+            for posting_id in posting_ids if posting_id in postings
+        ], getattr(request, 'user', None))
+
+        return JsonResponse({'postings' : result}, status=200)
       
 class LikeView(View):    
     @authorize_user
     def post(self, request, posting_id):
         user = request.user
         
-        Like.objects.create(
-                user_id    = user.id,
-                posting_id = posting_id
-            )
+        try:
+            with transaction.atomic():
+                Like.objects.create(
+                        user_id    = user.id,
+                        posting_id = posting_id
+                    )
+                if not Posting.objects.filter(id=posting_id).update(score=score_change(likes=1), like_count=F('like_count')+1):
+                    raise Posting.DoesNotExist
+                transaction.on_commit(feed_cache.counts_changed)
+
+        except IntegrityError:
+            if not Like.objects.filter(user_id=user.id, posting_id=posting_id).exists():
+                return JsonResponse({'message': 'object does not exist'}, status=404)
+            return JsonResponse({'message':'ALREADY_LIKED'}, status=200)
+
+        except Posting.DoesNotExist:
+            return JsonResponse({'message': 'object does not exist'}, status=404)
         
         return JsonResponse({'message':'CREATE_LIKE'}, status=201)
          
@@ -150,8 +351,32 @@ class LikeView(View):
     def delete(self, request, posting_id):
         user = request.user
         
-        Like.objects.get(
-            user_id    = user.id,
-            posting_id = posting_id
-            ).delete()
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(
+                user_id    = user.id,
+                posting_id = posting_id
+                ).delete()
+
+            if deleted:
+                Posting.objects.filter(id=posting_id).update(score=score_change(likes=-deleted), like_count=F('like_count')-deleted)
+                transaction.on_commit(feed_cache.counts_changed)
+
+        if not deleted:
+            return JsonResponse({'message': 'NOT_LIKED'}, status=200)
         return JsonResponse({'message': 'DELETE_LIKE'}, status=204)
+
+class LikeStatusView(View):
+    @authorize_user
+    def get(self, request):
+        try:
+            posting_ids = posting_ids_param(request)
+        except KeyError:
+            return JsonResponse({'message': 'KEY_ERROR'}, status=400)
+        except ValueError:
+            return JsonResponse({'message': 'INVALID_IDS'}, status=400)
+
+        if len(posting_ids) > settings.POSTING_BATCH_LIMIT:
+            return JsonResponse({'message': 'TOO_MANY_IDS'}, status=400)
+
+        result = mark_liked([{'id': posting_id} for posting_id in posting_ids], request.user)
+        return JsonResponse({'result': result}, status=200)
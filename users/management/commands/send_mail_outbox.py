@@ -0,0 +1,27 @@
+import time
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+
+from users.utils import deliver_outbox
+
+class Command(BaseCommand):
+    help = 'Deliver queued mail from mail_outbox over one SMTP connection per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.MAIL_OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=5, help='seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='deliver what is due now and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_outbox(options['batch_size'])
+
+            if sent or failed:
+                self.stdout.write(f'{sent} sent, {failed} failed')
+                continue
+
+            if options['once']:
+                return
+
+            time.sleep(options['interval'])
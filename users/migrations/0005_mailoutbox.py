@@ -0,0 +1,36 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_auto_20210623_0408'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('receiver', models.CharField(max_length=50)),
+                ('subject', models.CharField(max_length=200)),
+                ('body', models.TextField()),
+                ('status', models.CharField(default='pending', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(null=True)),
+                ('create_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'db_table': 'mail_outbox',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mailoutbox',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='mail_outbox_pending_idx'),
+        ),
+    ]
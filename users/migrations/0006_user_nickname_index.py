@@ -0,0 +1,17 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_mailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['nickname'], name='users_nickname_idx'),
+        ),
+    ]
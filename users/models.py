@@ -1,4 +1,5 @@
-from django.db import models
+from django.db    import models
+from django.utils import timezone
 
 class User(models.Model):
     email         = models.CharField(max_length=50)
@@ -9,4 +10,24 @@ class User(models.Model):
     is_delete     = models.BooleanField(default=False)
     
     class Meta:
-        db_table = 'users'
\ No newline at end of file
+        db_table = 'users'
+        indexes  = [
+            models.Index(fields=['nickname'], name='users_nickname_idx'),
+        ]
+
+class MailOutbox(models.Model):
+    receiver        = models.CharField(max_length=50)
+    subject         = models.CharField(max_length=200)
+    body            = models.TextField()
+    status          = models.CharField(max_length=10, default='pending')
+    attempts        = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error      = models.TextField(null=True)
+    create_at       = models.DateTimeField(auto_now_add=True)
+    sent_at         = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'mail_outbox'
+        indexes  = [
+            models.Index(fields=['status', 'next_attempt_at'], name='mail_outbox_pending_idx'),
+        ]
@@ -1,18 +1,77 @@
+import gc
 import jwt
 import json
+import time
+import asyncio
 import datetime
-from unittest.mock        import patch, MagicMock
-
-from django.http.response import JsonResponse
-from django.test          import TestCase, Client
-from django.test.client   import RequestFactory
-
-from .models         import User
-from .utils          import authorize_user,sort_user
+import threading
+import warnings
+from io                     import StringIO
+from http.server            import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver           import StreamRequestHandler, ThreadingTCPServer
+from unittest.mock          import patch
+
+from django.http.response   import JsonResponse
+from django.test            import TestCase, Client, override_settings
+from django.test.client     import RequestFactory
+from django.core.management import call_command
+from django.utils           import timezone
+
+from .models         import User, MailOutbox
+from .utils          import Mail, authorize_user,sort_user,user_cache,kakao_api,deliver_outbox,check_nickname
 from postings.models import Posting, HousingType, Style, Size, Color, Like
 from my_settings     import SECRET_KEY,ALGORITHM
 
+class FakeKakaoHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+
+        body = json.dumps(self.server.response.json()).encode()
+        self.send_response(self.server.response.status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class FakeKakaoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeKakaoHandler)
+        self.url = f'http://127.0.0.1:{self.server_port}'
+        self.respond(None)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def handle_error(self, request, client_address):
+        pass
+
+    def respond(self, response, delay=0):
+        self.response = response
+        self.delay    = delay
+        self.requests = 0
+
 class SignInTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.kakao    = FakeKakaoServer()
+        cls.kakao_settings = override_settings(KAKAO_API_URL=cls.kakao.url)
+        cls.kakao_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.kakao_settings.disable()
+        cls.kakao.shutdown()
+        cls.kakao.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        kakao_api.breaker.reset()
+
     @classmethod
     def setUpTestData(cls):
         User.objects.create(
@@ -22,8 +81,7 @@ class SignInTest(TestCase):
             email         = "anne_with_an_e@kakao.com"
         )
 
-    @patch("users.views.requests")
-    def test_kakao_signin_success_existing_user(self,mocked_requests):
+    def test_kakao_signin_success_existing_user(self):
         class MockedResponse:
             status_code = 200
 
@@ -45,7 +103,7 @@ class SignInTest(TestCase):
                     }
                 }
 
-        mocked_requests.get           = MagicMock(return_value=MockedResponse())
+        SignInTest.kakao.respond(MockedResponse())
         response                      = Client().post('/users/signin', HTTP_AUTHORIZATION='access_token')
         response.json()['self_token'] = 'self_token'
 
@@ -63,8 +121,7 @@ class SignInTest(TestCase):
             response.status_code,200
         )
         
-    @patch("users.views.requests")
-    def test_kakao_signin_success_new_user(self,mocked_requests):     
+    def test_kakao_signin_success_new_user(self):     
         class MockedResponse:
             status_code = 200
 
@@ -86,7 +143,7 @@ class SignInTest(TestCase):
                     }
                 }
         
-        mocked_requests.get  = MagicMock(return_value=MockedResponse())
+        SignInTest.kakao.respond(MockedResponse())
         response             = Client().post('/users/signin', HTTP_AUTHORIZATION='access_token')
 
         self.assertEqual(
@@ -102,8 +159,7 @@ class SignInTest(TestCase):
             response.status_code,200
         )
 
-    @patch("users.views.requests")
-    def test_kakao_signin_success_new_user_no_profile_image(self,mocked_requests):
+    def test_kakao_signin_success_new_user_no_profile_image(self):
         class MockedResponse:
             status_code = 200
 
@@ -125,7 +181,7 @@ class SignInTest(TestCase):
                     }
                 }
 
-        mocked_requests.get = MagicMock(return_value=MockedResponse())
+        SignInTest.kakao.respond(MockedResponse())
         response            = Client().post('/users/signin', HTTP_AUTHORIZATION='access_token')
 
         self.assertEqual(
@@ -141,8 +197,7 @@ class SignInTest(TestCase):
             response.status_code,200
         )
 
-    @patch("users.views.requests")
-    def test_kakao_signin_error_is_response_from_kakao(self,mocked_requests):
+    def test_kakao_signin_error_is_response_from_kakao(self):
         class MockedResponse:
             status_code = 400
 
@@ -153,7 +208,7 @@ class SignInTest(TestCase):
                 "error_code" : "error_code"
                 }
         
-        mocked_requests.get = MagicMock(return_value=MockedResponse())
+        SignInTest.kakao.respond(MockedResponse())
         response            = Client().post('/users/signin', HTTP_AUTHORIZATION='access_token')
 
         self.assertEqual(
@@ -164,8 +219,7 @@ class SignInTest(TestCase):
             response.status_code,401
         )
 
-    @patch("users.views.requests")
-    def test_kakao_signin_key_error(self,mocked_requests):
+    def test_kakao_signin_key_error(self):
 
         class MockedResponse():
             status_code = 200
@@ -173,7 +227,7 @@ class SignInTest(TestCase):
             def json(self):
                 return {}
         
-        mocked_requests.get = MagicMock(return_value=MockedResponse())
+        SignInTest.kakao.respond(MockedResponse())
         response            = Client().post('/users/signin', HTTP_AUTHORIZATION='access_token')
 
         self.assertEqual(
@@ -184,6 +238,88 @@ class SignInTest(TestCase):
             response.status_code,400
         )
 
+    def test_kakao_signin_concurrent_requests(self):
+        class MockedResponse:
+            status_code = 200
+
+            def json(self):
+                return {"id":1111111111}
+
+        async def sign_in_all():
+            return await asyncio.gather(*[kakao_api.get_profile('access_token') for _ in range(20)])
+
+        SignInTest.kakao.respond(MockedResponse(), delay=0.2)
+        started   = time.monotonic()
+        responses = asyncio.run(sign_in_all())
+
+        self.assertEqual([response.status_code for response in responses], [200]*20)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_kakao_client_closed_with_loop(self):
+        class MockedResponse:
+            status_code = 200
+
+            def json(self):
+                return {"id":1111111111}
+
+        async def sign_in():
+            await kakao_api.get_profile('access_token')
+            return await kakao_api.client()
+
+        SignInTest.kakao.respond(MockedResponse())
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            clients = [asyncio.run(sign_in()) for _ in range(3)]
+            for _ in range(3):
+                Client().post('/users/signin', HTTP_AUTHORIZATION='access_token')
+            gc.collect()
+
+        self.assertTrue(all(client.is_closed for client in clients))
+        self.assertEqual([str(warning.message) for warning in caught if 'Unclosed' in str(warning.message)], [])
+
+    @override_settings(KAKAO_TIMEOUT=0.1)
+    def test_kakao_signin_timeout(self):
+        class MockedResponse:
+            status_code = 200
+
+            def json(self):
+                return {}
+
+        SignInTest.kakao.respond(MockedResponse(), delay=0.5)
+        response = Client().post('/users/signin', HTTP_AUTHORIZATION='access_token')
+
+        self.assertEqual(
+            response.json(),
+            {'message':'CONNECTION ERROR'}
+        )
+        self.assertEqual(
+            response.status_code,400
+        )
+
+    @patch.object(kakao_api.breaker, 'threshold', 3)
+    def test_kakao_signin_circuit_breaker(self):
+        class MockedResponse:
+            status_code = 500
+
+            def json(self):
+                return {}
+
+        SignInTest.kakao.respond(MockedResponse())
+
+        for _ in range(3):
+            Client().post('/users/signin', HTTP_AUTHORIZATION='access_token')
+        response = Client().post('/users/signin', HTTP_AUTHORIZATION='access_token')
+
+        self.assertEqual(
+            response.json(),
+            {'message':'KAKAO UNAVAILABLE'}
+        )
+        self.assertEqual(
+            response.status_code,503
+        )
+        self.assertEqual(SignInTest.kakao.requests, 3)
+
+
 class NicknameCheckTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -241,6 +377,41 @@ class NicknameCheckTest(TestCase):
             response.status_code, 400
         )
 
+    def test_nickname_check_recommends_first_free_suffix(self):
+        User.objects.bulk_create([
+            User(kakao_id='1', nickname=f'정연{number}', email='jyeon@kakao.com') for number in (1, 2, 4)
+        ])
+
+        with self.assertNumQueries(1):
+            response = Client().post('/users/nickname-check', {'nickname':'정연'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['recommend_nickname'], '정연3')
+
+    @override_settings(NICKNAME_SUGGESTION_PROBES=4, NICKNAME_SUGGESTION_DIGITS=2)
+    @patch('users.utils.random.sample', return_value=[50, 7])
+    def test_nickname_check_probes_random_suffixes(self, mock_sample):
+        User.objects.bulk_create([
+            User(kakao_id='1', nickname=f'정연{number}', email='jyeon@kakao.com') for number in range(1, 11)
+        ])
+
+        self.assertEqual(check_nickname('정연'), (False, '정연50'))
+        self.assertEqual(mock_sample.call_args.args, (range(3, 100), 2))
+        self.assertEqual(check_nickname('명준'), (True, None))
+
+    @override_settings(NICKNAME_SUGGESTION_PROBES=4, NICKNAME_SUGGESTION_DIGITS=2)
+    @patch('users.utils.random.sample', side_effect=[[50, 7], [300, 120, 500, 999]])
+    def test_nickname_check_retries_when_all_probes_taken(self, mock_sample):
+        User.objects.bulk_create([
+            User(kakao_id='1', nickname=f'정연{number}', email='jyeon@kakao.com') for number in (1, 2, 7, 50, 120)
+        ])
+
+        with self.assertNumQueries(2):
+            response = Client().post('/users/nickname-check', {'nickname':'정연'}, content_type='application/json')
+
+        self.assertEqual(response.json(), {'message':'NICKNAME ALEADY EXISTS', 'recommend_nickname': '정연300'})
+        self.assertEqual(mock_sample.call_args.args, (range(100, 1000), 4))
+
     def test_nickname_check_key_error(self):
         response     = Client().post(
             '/users/nickname-check',
@@ -287,6 +458,10 @@ class SignUpTest(TestCase):
         self.assertEqual(
             response.status_code, 201
         )
+        self.assertEqual(
+            list(MailOutbox.objects.values_list('receiver', 'status')),
+            [('email', 'pending')]
+        )
 
     def test_sign_up_key_error(self):
         response = Client().post('/users/signup', {}, content_type='application/json')
@@ -311,6 +486,96 @@ class SignUpTest(TestCase):
             response.status_code, 400
         )
 
+class FakeSMTPHandler(StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 fake smtp')
+
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb    = command.split(' ')[0].upper()
+
+            if verb == 'EHLO':
+                self.reply('250-fake smtp')
+                self.reply('250 AUTH PLAIN')
+            elif verb == 'AUTH':
+                self.reply('235 authenticated')
+            elif verb == 'RCPT' and 'bounce' in command:
+                self.reply('550 no such user')
+            elif verb == 'DATA':
+                self.reply('354 go ahead')
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                self.server.messages += 1
+                self.reply('250 queued')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+class FakeSMTPServer(ThreadingTCPServer):
+    daemon_threads      = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeSMTPHandler)
+        self.connections = 0
+        self.messages    = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+class MailOutboxTest(TestCase):
+    def setUp(self):
+        self.smtp          = FakeSMTPServer()
+        self.smtp_settings = override_settings(
+            EMAIL_SMTP_HOST = '127.0.0.1',
+            EMAIL_SMTP_PORT = self.smtp.server_address[1],
+            EMAIL_USE_SSL   = False
+        )
+        self.smtp_settings.enable()
+
+    def tearDown(self):
+        self.smtp_settings.disable()
+        self.smtp.shutdown()
+        self.smtp.server_close()
+
+    def test_deliver_outbox_one_connection_per_batch(self):
+        for number in range(5):
+            Mail(f'user{number}@kakao.com', 'welcome', 'mail_signup.html').queue()
+
+        call_command('send_mail_outbox', '--once', '--batch-size=3', stdout=StringIO())
+
+        self.assertEqual(self.smtp.messages, 5)
+        self.assertEqual(self.smtp.connections, 2)
+        self.assertEqual(MailOutbox.objects.filter(status='sent').count(), 5)
+
+    def test_deliver_outbox_retry_with_backoff(self):
+        Mail('bounce@kakao.com', 'welcome', 'mail_signup.html').queue()
+        Mail('jyeon@kakao.com', 'welcome', 'mail_signup.html').queue()
+
+        self.assertEqual(deliver_outbox(10), (1, 1))
+
+        mail = MailOutbox.objects.get(receiver='bounce@kakao.com')
+        self.assertEqual((mail.status, mail.attempts), ('pending', 1))
+        self.assertGreater(mail.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_outbox(10), (0, 0))
+
+        MailOutbox.objects.filter(id=mail.id).update(attempts=4, next_attempt_at=timezone.now())
+        deliver_outbox(10)
+        self.assertEqual(MailOutbox.objects.get(id=mail.id).status, 'failed')
+
+    def test_deliver_outbox_smtp_unavailable(self):
+        Mail('jyeon@kakao.com', 'welcome', 'mail_signup.html').queue()
+        self.smtp.shutdown()
+        self.smtp.server_close()
+
+        self.assertEqual(deliver_outbox(10), (0, 1))
+        self.assertEqual(MailOutbox.objects.get().attempts, 1)
+
 class AuthorizseUserTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -335,6 +600,41 @@ class AuthorizseUserTest(TestCase):
             AuthorizseUserTest.user.id
         )
 
+    def test_authorize_user_decorator_caches_user(self):
+        @authorize_user
+        def mocked_view(self,request):
+            return request.user.nickname
+
+        user_cache.clear()
+        request = RequestFactory().get('', HTTP_AUTHORIZATION=AuthorizseUserTest.token)
+        with self.assertNumQueries(1):
+            mocked_view(self,request)
+        with self.assertNumQueries(0):
+            response = mocked_view(self,request)
+
+        self.assertEqual(response, '정연')
+
+    def test_authorize_user_decorator_deleted_user(self):
+        @authorize_user
+        def mocked_view(self,request):
+            return request.user.id
+
+        request = RequestFactory().get('', HTTP_AUTHORIZATION=AuthorizseUserTest.token)
+        mocked_view(self,request)
+
+        user           = User.objects.get(id=AuthorizseUserTest.user.id)
+        user.is_delete = True
+        user.save()
+        response = mocked_view(self,request)
+
+        self.assertEqual(
+            response.content.decode('utf-8'),
+            '{"message": "INVALID USER"}'
+        )
+        self.assertEqual(
+            response.status_code, 401
+        )
+
     def test_authorize_user_decorator_invalid_user(self):
         @authorize_user
         def mocked_view(self,request):
@@ -496,4 +796,18 @@ class AccountTest(TestCase):
         )
         self.assertEqual(
             response.status_code, 200
-        )
\ No newline at end of file
+        )
+
+    @override_settings(STREAM_BUFFER_SIZE=8)
+    def test_mypage_stream(self):
+        user     = User.objects.get(kakao_id="1111111111")
+        token    = jwt.encode({'id': user.id}, SECRET_KEY, ALGORITHM)
+        response = Client().get('/users?stream=1', HTTP_AUTHORIZATION=token)
+        chunks   = list(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(
+            json.loads(b''.join(chunks)),
+            Client().get('/users', HTTP_AUTHORIZATION=token).json()
+        )
@@ -1,22 +1,92 @@
-import jwt,smtplib,ssl
+import jwt,smtplib,ssl,threading,time,copy,asyncio,weakref,datetime,random,itertools,httpx
+from collections   import OrderedDict
+from functools     import update_wrapper
 from email.message import EmailMessage
 
-from django.http import JsonResponse
-from django.template.loader import get_template
+from django.conf              import settings
+from django.db                import transaction
+from django.db.models.signals import post_save, post_delete
+from django.http              import JsonResponse
+from django.template.loader   import get_template
+from django.utils             import timezone
+from django.utils.decorators  import classonlymethod
+from django.views             import View
 
-from .models     import User
-from my_settings import SECRET_KEY, ALGORITHM, EMAIL_HOST,EMAIL_PASSWORD, EMAIL_PORT
+from .models     import User, MailOutbox
+from my_settings import SECRET_KEY, ALGORITHM, EMAIL_HOST,EMAIL_PASSWORD
+
+class TTLCache:
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.items   = OrderedDict()
+        self.lock    = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+
+            if item is None:
+                return None
+
+            value, expires_at = item
+
+            if expires_at <= time.monotonic():
+                del self.items[key]
+                return None
+
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (value, time.monotonic() + self.timeout)
+            self.items.move_to_end(key)
+
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+token_cache = TTLCache(getattr(settings, 'AUTH_CACHE_SIZE', 1024), getattr(settings, 'AUTH_CACHE_TIMEOUT', 300))
+user_cache  = TTLCache(getattr(settings, 'AUTH_CACHE_SIZE', 1024), getattr(settings, 'AUTH_CACHE_TIMEOUT', 300))
+
+def clear_cached_user(sender, instance, **kwargs):
+    user_cache.delete(instance.id)
+    user_cache.delete(str(instance.id))
+
+post_save.connect(clear_cached_user, sender=User)
+post_delete.connect(clear_cached_user, sender=User)
+
+def get_user(self_token):
+    user_id = token_cache.get(self_token)
+
+    if user_id is None:
+        user_id = jwt.decode(self_token, SECRET_KEY, ALGORITHM)['id']
+        token_cache.set(self_token, user_id)
+
+    user = user_cache.get(user_id)
+
+    if user is None:
+        user = User.objects.get(id=user_id, is_delete=False)
+        user_cache.set(user_id, user)
+
+    return copy.copy(user)
 
 def authorize_user(func):
     def wrapper(self,request, **kwarg):
         try:
-            self_token = request.headers['Authorization']
-            payload    = jwt.decode(self_token, SECRET_KEY, ALGORITHM)
-
-            if not User.objects.filter(id=payload['id']).exists():
-                return JsonResponse({'message' : 'INVALID USER'}, status=401)
+            self_token   = request.headers['Authorization']
+            request.user = get_user(self_token)
 
-            request.user = User.objects.get(id=payload['id'])
+        except User.DoesNotExist:
+            return JsonResponse({'message' : 'INVALID USER'}, status=401)
 
         except KeyError:
             return JsonResponse({'message' : 'KEY ERROR'},status=401)     
@@ -29,63 +99,236 @@ def authorize_user(func):
     return wrapper
 
 def sort_user(func):
-    def wrapper(self,request):
+    def wrapper(self,request,**kwarg):
         try:
             self_token = request.headers.get('Authorization')
 
             if self_token == None:
-                return func(self,request)
-
-            payload    = jwt.decode(self_token, SECRET_KEY, ALGORITHM)
+                return func(self,request,**kwarg)
 
-            if not User.objects.filter(id=payload['id']).exists():
-                return JsonResponse({'message':'INVALID USER'}, status=401)
+            request.user = get_user(self_token)
 
-            request.user = User.objects.get(id=payload['id'])
+        except User.DoesNotExist:
+            return JsonResponse({'message':'INVALID USER'}, status=401)
 
         except jwt.DecodeError:
             return JsonResponse({'message':'JWT DECODE ERROR'},status=401)
 
-        return func(self,request)
+        return func(self,request,**kwarg)
 
     return wrapper
 
-def send_mail_all(self,receiver_email,email_message):
-    try:
-        context = ssl.create_default_context()
+def optional_user(func):
+    def wrapper(self,request,**kwarg):
+        self_token = request.headers.get('Authorization')
+
+        if self_token is not None:
+            try:
+                request.user = get_user(self_token)
+
+            except (User.DoesNotExist, jwt.InvalidTokenError, KeyError):
+                pass
+
+        return func(self,request,**kwarg)
+
+    return wrapper
+
+def nickname_candidates(nickname, probes):
+    sequential = list(range(1, probes//2+1))
+    randoms    = random.sample(range(probes//2+1, 10**settings.NICKNAME_SUGGESTION_DIGITS), probes-len(sequential))
+    return [f'{nickname}{number}' for number in sequential + sorted(randoms)]
+
+def check_nickname(nickname):
+    candidates = nickname_candidates(nickname, settings.NICKNAME_SUGGESTION_PROBES)
+    taken      = set(User.objects.filter(nickname__in=[nickname, *candidates]).values_list('nickname', flat=True))
+
+    if nickname not in taken:
+        return True, None
+
+    for digits in itertools.count(settings.NICKNAME_SUGGESTION_DIGITS+1):
+        suggestion = next((candidate for candidate in candidates if candidate not in taken), None)
+        if suggestion:
+            return False, suggestion
+
+        candidates = [f'{nickname}{number}' for number in sorted(random.sample(range(10**(digits-1), 10**digits), settings.NICKNAME_SUGGESTION_PROBES))]
+        taken      = set(User.objects.filter(nickname__in=candidates).values_list('nickname', flat=True))
+
+class AsyncView(View):
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
 
-        with smtplib.SMTP_SSL('smtp.gmail.com',EMAIL_PORT,context=context) as server:
-            server.login(EMAIL_HOST,EMAIL_PASSWORD)
-            server.sendmail(EMAIL_HOST,receiver_email,email_message.as_string())
-            server.quit()
-    except:
-        pass
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        update_wrapper(async_view, view)
+        return async_view
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, threshold, reset_timeout):
+        self.threshold     = threshold
+        self.reset_timeout = reset_timeout
+        self.failures      = 0
+        self.opened_at     = None
+
+    def before_call(self):
+        if self.opened_at is None:
+            return
+
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            raise CircuitOpenError
+
+        self.opened_at = None
+        self.failures  = self.threshold - 1
+
+    def succeeded(self):
+        self.failures  = 0
+        self.opened_at = None
+
+    def failed(self):
+        self.failures += 1
+
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def reset(self):
+        self.succeeded()
+
+class KakaoAPI:
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.clients = weakref.WeakKeyDictionary()
+
+    async def client(self):
+        loop  = asyncio.get_running_loop()
+        entry = self.clients.get(loop)
+
+        if entry is None:
+            client   = httpx.AsyncClient(
+                timeout = httpx.Timeout(settings.KAKAO_TIMEOUT, connect=settings.KAKAO_CONNECT_TIMEOUT),
+                limits  = httpx.Limits(
+                    max_connections           = settings.KAKAO_MAX_CONNECTIONS,
+                    max_keepalive_connections = settings.KAKAO_MAX_CONNECTIONS
+                )
+            )
+            lifetime = self.close_with_loop(client)
+            entry    = self.clients[loop] = (client, lifetime)
+            await lifetime.__anext__()
+        return entry[0]
+
+    @staticmethod
+    async def close_with_loop(client):
+        try:
+            yield
+        finally:
+            await client.aclose()
+
+    async def get_profile(self, access_token):
+        self.breaker.before_call()
+        client = await self.client()
+
+        try:
+            response = await client.get(
+                f'{settings.KAKAO_API_URL}/v2/user/me',
+                headers = {'Authorization':f'Bearer {access_token}'}
+            )
+        except httpx.TransportError:
+            self.breaker.failed()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.failed()
+        else:
+            self.breaker.succeeded()
+        return response
+
+kakao_api = KakaoAPI(CircuitBreaker(settings.KAKAO_BREAKER_THRESHOLD, settings.KAKAO_BREAKER_RESET_TIMEOUT))
 
 class Mail:
     def __init__(self, receiver, subject, template):
-        try:
-            self.receiver = receiver
-            self.message  = EmailMessage()
+        self.receiver = receiver
+        self.subject  = subject
+        self.body     = get_template(template).render(context={'receiver':self.receiver})
+
+    def queue(self):
+        return MailOutbox.objects.create(
+            receiver = self.receiver,
+            subject  = self.subject,
+            body     = self.body
+        )
+
+def build_message(mail):
+    message = EmailMessage()
+
+    message["Subject"] = mail.subject
+    message["From"]    = EMAIL_HOST
+    message["To"]      = mail.receiver
+    message.set_content(mail.body,'html')
+    return message
+
+def connect_smtp():
+    if settings.EMAIL_USE_SSL:
+        server = smtplib.SMTP_SSL(settings.EMAIL_SMTP_HOST, settings.EMAIL_SMTP_PORT, context=ssl.create_default_context(), timeout=settings.EMAIL_TIMEOUT)
+    else:
+        server = smtplib.SMTP(settings.EMAIL_SMTP_HOST, settings.EMAIL_SMTP_PORT, timeout=settings.EMAIL_TIMEOUT)
 
-            self.message["Subject"] = subject
-            self.message["From"]    = EMAIL_HOST
-            self.message["To"]      = receiver
+    server.login(EMAIL_HOST,EMAIL_PASSWORD)
+    return server
 
-            content          = get_template(template)
-            content_rendered = content.render(context={'receiver':self.receiver})
-            self.message.set_content((content_rendered),'html')
-            
-        except:
-            pass        
+def retry_later(mail, error):
+    mail.attempts        += 1
+    mail.last_error       = str(error)
+    mail.next_attempt_at  = timezone.now() + datetime.timedelta(seconds=settings.MAIL_OUTBOX_RETRY_DELAY * 2**(mail.attempts-1))
+
+    if mail.attempts >= settings.MAIL_OUTBOX_MAX_ATTEMPTS:
+        mail.status = 'failed'
+
+    mail.save(update_fields=['attempts', 'last_error', 'next_attempt_at', 'status'])
+
+def deliver_outbox(batch_size):
+    sent, failed = 0, 0
+
+    with transaction.atomic():
+        mails = list(
+            MailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+
+        if not mails:
+            return sent, failed
 
-    def send(self):
         try:
-            context = ssl.create_default_context()
-
-            with smtplib.SMTP_SSL('smtp.gmail.com',EMAIL_PORT,context=context) as server:
-                server.login(EMAIL_HOST,EMAIL_PASSWORD)
-                server.sendmail(EMAIL_HOST,self.receiver, self.message.as_string())
-                server.quit()
-                
-        except:
-            pass
\ No newline at end of file
+            server = connect_smtp()
+        except (smtplib.SMTPException, OSError) as error:
+            for mail in mails:
+                retry_later(mail, error)
+            return sent, len(mails)
+
+        with server:
+            for index, mail in enumerate(mails):
+                try:
+                    server.sendmail(EMAIL_HOST, mail.receiver, build_message(mail).as_string())
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as error:
+                    retry_later(mail, error)
+                    failed += 1
+                    continue
+                except (smtplib.SMTPException, OSError) as error:
+                    for pending in mails[index:]:
+                        retry_later(pending, error)
+                    return sent, failed + len(mails) - index
+
+                mail.status  = 'sent'
+                mail.sent_at = timezone.now()
+                mail.save(update_fields=['status', 'sent_at'])
+                sent += 1
+
+    return sent, failed
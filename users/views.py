@@ -1,23 +1,25 @@
 import jwt
 import json
-import requests
+import httpx
 from json.decoder import JSONDecodeError
 
+from asgiref.sync import sync_to_async
+
+from django.conf  import settings
+from django.db    import transaction
 from django.views import View
 from django.http  import JsonResponse
 
-from .models     import User
-from .utils      import Mail, authorize_user
-from my_settings import SECRET_KEY,ALGORITHM
+from .models             import User
+from .utils              import Mail, AsyncView, CircuitOpenError, authorize_user, check_nickname, kakao_api
+from yourhousetoday.http import stream_requested, StreamingJsonResponse
+from my_settings         import SECRET_KEY,ALGORITHM
 
-class SingInView(View):
-    def post(self,request):
+class SingInView(AsyncView):
+    async def post(self,request):
         try:
             access_token = request.headers['Authorization']
-            response     = requests.get(
-                "https://kapi.kakao.com/v2/user/me",
-                headers = {'Authorization':f'Bearer {access_token}'}
-            )
+            response     = await kakao_api.get_profile(access_token)
 
             if response.status_code != 200:
                 return JsonResponse({'message':'INVALID TOKEN'}, status=401)
@@ -33,8 +35,9 @@ class SingInView(View):
                 'profile_image' : profile_image_url
             }
             
-            if User.objects.filter(kakao_id=user['id']).exists():
-                user = User.objects.get(kakao_id=user['id'])
+            user = await sync_to_async(User.objects.filter(kakao_id=user['id']).first)()
+
+            if user:
                 result['self_token'] = jwt.encode({'id': user.id}, SECRET_KEY, ALGORITHM)
                 
             return JsonResponse(result, status=200)
@@ -48,19 +51,19 @@ class SingInView(View):
         except jwt.DecodeError:
             return JsonResponse({'message':'JWT DECODE ERROR'}, status=400)
 
-        except ConnectionError:
+        except CircuitOpenError:
+            return JsonResponse({'message':'KAKAO UNAVAILABLE'}, status=503)
+
+        except httpx.TransportError:
             return JsonResponse({'message':'CONNECTION ERROR'}, status=400)
 
 class NicknameCheckView(View):
     def post(self,request):
         try:
-            nickname           = json.loads(request.body)['nickname']
+            nickname                = json.loads(request.body)['nickname']
+            available, new_nickname = check_nickname(nickname)
            
-            if User.objects.filter(nickname=nickname).exists():
-                users        = list(User.objects.filter(nickname__istartswith=nickname))
-                numbers      = list(map(lambda x: int(x.nickname.strip(nickname) or 0), users))
-                new_nickname = nickname + str(max(numbers)+1)
-
+            if not available:
                 return JsonResponse({'message':'NICKNAME ALEADY EXISTS','recommend_nickname':new_nickname},status=400)
 
             return JsonResponse({'message':'SUCCESS'}, status=200)
@@ -74,13 +77,23 @@ class NicknameCheckView(View):
 class SignUpView(View):
     def post(self,request):
         try:
-            data       = json.loads(request.body)
-            user       = User.objects.create(
-                email         = data['email'],
-                nickname      = data['nickname'],
-                profile_image = data.get('profile_image'),
-                kakao_id      = str(data['id'])
-            )
+            data = json.loads(request.body)
+
+            with transaction.atomic():
+                user = User.objects.create(
+                    email         = data['email'],
+                    nickname      = data['nickname'],
+                    profile_image = data.get('profile_image'),
+                    kakao_id      = str(data['id'])
+                )
+
+                signup_mail = Mail(
+                    receiver=data['email'],
+                    subject="Your House Today에 가입해주셔서 감사합니다!",
+                    template='mail_signup.html'
+                )
+                signup_mail.queue()
+
             self_token = jwt.encode({'id': user.id}, SECRET_KEY, ALGORITHM)
 
             result = {
@@ -88,13 +101,6 @@ class SignUpView(View):
                 'self_token'    : self_token    
             }
 
-            signup_mail = Mail(
-                receiver=data['email'],
-                subject="Your House Today에 가입해주셔서 감사합니다!",
-                template='mail_signup.html'
-            )
-            signup_mail.send()
-
             return JsonResponse(result, status=201)
 
         except KeyError:
@@ -109,9 +115,18 @@ class SignUpView(View):
 class AccountView(View):
     @authorize_user
     def get(self,request):
+        postings = request.user.posting.values_list('image', flat=True)
+
+        if stream_requested(request, postings.count()):
+            return StreamingJsonResponse({
+                'user'     : request.user.nickname,
+                'postings' : postings.iterator(chunk_size=settings.STREAM_CHUNK_SIZE),
+                'likes'    : request.user.like.count
+            }, status=200)
+
         result = {
             'user'     : request.user.nickname,
-            'postings' : [posting.image for posting in request.user.posting.all()],
+            'postings' : list(postings),
             'likes'    : request.user.like.count()
         }
         return JsonResponse(result, status=200)
\ No newline at end of file
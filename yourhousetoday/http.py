@@ -0,0 +1,64 @@
+import hashlib, itertools
+
+from django.conf                  import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http                  import StreamingHttpResponse
+from django.utils.cache           import get_conditional_response, set_response_etag
+
+def make_etag(*parts):
+    return 'W/"%s"' % hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+def conditional_response(request, response):
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response.get('ETag'), response=response)
+
+def stream_requested(request, size=0):
+    stream = request.GET.get('stream')
+    if stream in ('0', 'false'):
+        return False
+    return stream in ('1', 'true') or size > settings.STREAM_THRESHOLD
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    chunk    = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+class StreamingJsonResponse(StreamingHttpResponse):
+    def __init__(self, data, status=200):
+        self.encoder = DjangoJSONEncoder()
+        super().__init__(self.buffer(self.encode(data)), content_type='application/json', status=status)
+
+    def encode(self, value):
+        if callable(value):
+            value = value()
+
+        if isinstance(value, dict):
+            yield '{'
+            for index, (key, item) in enumerate(value.items()):
+                yield (', ' if index else '') + self.encoder.encode(key) + ': '
+                yield from self.encode(item)
+            yield '}'
+
+        elif isinstance(value, str) or not hasattr(value, '__iter__'):
+            yield self.encoder.encode(value)
+
+        else:
+            yield '['
+            for index, item in enumerate(value):
+                yield ', ' if index else ''
+                yield from self.encode(item)
+            yield ']'
+
+    def buffer(self, parts):
+        chunk = []
+        size  = 0
+        for part in parts:
+            chunk.append(part)
+            size += len(part)
+            if size >= settings.STREAM_BUFFER_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+                size  = 0
+        yield ''.join(chunk)
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 import os
 from pathlib      import Path
-from my_settings  import SECRET_KEY, DATABASES
+from my_settings  import SECRET_KEY, DATABASES, EMAIL_PORT
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -127,6 +127,90 @@ STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Posting view counts are buffered in-process and written back in batches
+VIEW_COUNT_BUFFER_SIZE    = 100
+VIEW_COUNT_FLUSH_INTERVAL = 10
+
+# Seconds a worker keeps housing type / size / style / color rows cached
+LOOKUP_TABLE_TIMEOUT = 300
+
+# Verified JWTs and their users are cached per worker (LRU entries, seconds)
+AUTH_CACHE_SIZE    = 1024
+AUTH_CACHE_TIMEOUT = 300
+
+# Kakao profile API used by sign-in (seconds, pooled connections, circuit breaker)
+KAKAO_API_URL               = 'https://kapi.kakao.com'
+KAKAO_TIMEOUT               = 3
+KAKAO_CONNECT_TIMEOUT       = 1
+KAKAO_MAX_CONNECTIONS       = 100
+KAKAO_BREAKER_THRESHOLD     = 5
+KAKAO_BREAKER_RESET_TIMEOUT = 30
+
+# Outgoing mail is queued in mail_outbox and delivered by `manage.py send_mail_outbox`
+EMAIL_SMTP_HOST          = 'smtp.gmail.com'
+EMAIL_SMTP_PORT          = EMAIL_PORT
+EMAIL_USE_SSL            = True
+EMAIL_TIMEOUT            = 10
+MAIL_OUTBOX_BATCH_SIZE   = 50
+MAIL_OUTBOX_MAX_ATTEMPTS = 5
+MAIL_OUTBOX_RETRY_DELAY  = 60
+
+# Posting images go to S3 through one shared client; large files as parallel multipart uploads
+S3_MAX_POOL_CONNECTIONS = 20
+S3_MULTIPART_THRESHOLD  = 8 * 1024 * 1024
+S3_MULTIPART_CHUNKSIZE  = 8 * 1024 * 1024
+S3_MAX_CONCURRENCY      = 4
+
+# Presigned POSTs let clients send posting images straight to S3
+S3_PRESIGNED_EXPIRES = 300
+S3_UPLOAD_MAX_SIZE   = 20 * 1024 * 1024
+
+# Feed/detail image derivatives are rendered in a process pool after upload
+IMAGE_DERIVATIVE_WORKERS = 2
+IMAGE_DERIVATIVE_QUALITY = 80
+
+# Serialized feed pages are cached under their normalized filters.
+# Point CACHES at a shared backend (memcached/redis) in production so
+# invalidation and hit/miss counters are seen by every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+FEED_CACHE_ALIAS   = 'default'
+FEED_CACHE_TIMEOUT = 30
+
+# List endpoints stream their JSON when the requested size exceeds
+# STREAM_THRESHOLD (?stream=1/0 forces it); rows are fetched STREAM_CHUNK_SIZE at a time.
+STREAM_THRESHOLD   = 100
+STREAM_CHUNK_SIZE  = 100
+STREAM_BUFFER_SIZE = 8 * 1024
+
+# Maximum number of ids accepted by /postings/batch.
+POSTING_BATCH_LIMIT = 50
+
+# sort=popular orders by postings.score: log2 of weighted views, likes and comments
+# plus one point per POPULAR_HALF_LIFE seconds of create_at, so it never needs re-decaying.
+POPULAR_VIEW_WEIGHT    = 1
+POPULAR_LIKE_WEIGHT    = 10
+POPULAR_COMMENT_WEIGHT = 5
+POPULAR_HALF_LIFE      = 3 * 24 * 60 * 60
+POPULAR_SCORE_BATCH    = 1000
+
+# Taken nicknames get a numeric-suffix suggestion from one IN (...) lookup over
+# the first PROBES/2 suffixes plus random ones below 10**DIGITS. If all of them
+# are taken, another PROBES random suffixes one digit longer are tried.
+NICKNAME_SUGGESTION_PROBES = 20
+NICKNAME_SUGGESTION_DIGITS = 6
+
+# Comment threads embed the first N replies of each top-level comment;
+# the rest are paged through /comments/<id>/replies.
+COMMENT_REPLIES_PER_THREAD = 3
+
+# Comment list ETags are validated from the posting row only, so author nicknames
+# and profile images in a cached list may be stale for at most this many seconds.
+COMMENT_AUTHOR_STALENESS = 60
+
 #REMOVE_APPEND_SLASH_WARNING
 APPEND_SLASH = False
 